@@ -10,7 +10,23 @@
 # the character's knowledge of the player, reputation, possession of items, and actions to determine the 
 # character's response during an interaction.
 #
-# Setup: Python installed. No additional packages required.
+# Setup: Python installed. The batch evaluator needs NumPy ('pip install numpy').
+#
+# Usage: 'python AdventureGameAI.py' evaluates the single interaction below. For a whole population of NPCs per game
+# tick, 'char_interaction_batch' takes one array per argument and returns a response code per NPC in one NumPy pass:
+# the decision tree is compiled once into a lookup table indexed by the encoded inputs, and RESPONSES maps codes back
+# to the response strings. '--verify' checks the table against char_interaction on every input combination and
+# '--benchmark' compares NPCs/sec with calling char_interaction per NPC.
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+# Categories the decision tree distinguishes; any other reputation or action behaves like the last entry
+REP_VALUES = ('good', 'bad', 'other')
+ACTION_VALUES = ('kind', 'aggressive', 'other')
 
 def char_interaction(enter_room, 
                      knows_player, 
@@ -48,13 +64,122 @@ def char_interaction(enter_room,
         # Routine behavior when player doesn't trigger an interaction
         return 'continues_routine'
 
-# Testing the function with specified parameters
-response = char_interaction(
-    enter_room=True,
-    knows_player=False,
-    rep='good',
-    has_item=False,
-    action='kind',
-    apologizes=True
-)
-print(response) # Output the character's response based on the inputs
+# Sizes of each input's code range, in lookup-table index order
+INPUT_SIZES = (2, 2, len(REP_VALUES), 2, len(ACTION_VALUES), 2)
+
+# Compile the decision tree: evaluate char_interaction once per input combination and store its response code
+def compile_interaction_table():
+    responses = []
+    table = np.empty(int(np.prod(INPUT_SIZES)), dtype=np.uint8)
+    for index, codes in enumerate(itertools.product(*(range(size) for size in INPUT_SIZES))):
+        enter_room, knows_player, rep, has_item, action, apologizes = codes
+        response = char_interaction(bool(enter_room), bool(knows_player), REP_VALUES[rep], bool(has_item),
+                                    ACTION_VALUES[action], bool(apologizes))
+        if response not in responses:
+            responses.append(response)
+        table[index] = responses.index(response)
+    return tuple(responses), table
+
+RESPONSES, INTERACTION_TABLE = compile_interaction_table()
+
+# Map a column of category strings to codes; values outside the known categories get the 'other' code.
+# Integer arrays are taken as codes already and must be in range
+def encode_category(values, categories):
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        if np.any((values < 0) | (values >= len(categories))):
+            raise ValueError(f"Codes must be in the range 0-{len(categories) - 1} for {categories}")
+        return values
+    codes = np.full(values.shape, len(categories) - 1, dtype=np.intp)
+    for code, category in enumerate(categories[:-1]):
+        codes[values == category] = code
+    return codes
+
+# Response codes for a whole population: combine the encoded columns into a table index and look them all up at once
+def char_interaction_batch(enter_room, knows_player, rep, has_item, action, apologizes):
+    index = np.asarray(enter_room).astype(bool).astype(np.intp)
+    for column, size in zip((knows_player, encode_category(rep, REP_VALUES), has_item,
+                             encode_category(action, ACTION_VALUES), apologizes), INPUT_SIZES[1:]):
+        column = np.asarray(column)
+        index = index * size + (column.astype(bool) if size == 2 else column)
+    return INTERACTION_TABLE[index]
+
+# Turn response codes back into the strings char_interaction returns
+def decode_responses(codes):
+    return np.asarray(RESPONSES, dtype=object)[codes]
+
+# Check the compiled table against char_interaction on every input combination, with extra rep/action spellings
+def verify_compiled():
+    rep_inputs = ('good', 'bad', 'neutral', 'Good', '')
+    action_inputs = ('kind', 'aggressive', 'ignores', 'KIND', '')
+    combinations = list(itertools.product((False, True), (False, True), rep_inputs, (False, True),
+                                          action_inputs, (False, True)))
+    expected = [char_interaction(*combination) for combination in combinations]
+    columns = [np.array(column) for column in zip(*combinations)]
+    actual = decode_responses(char_interaction_batch(*columns)).tolist()
+    mismatches = sum(e != a for e, a in zip(expected, actual))
+    print(f"Verified {len(combinations)} input combinations: {mismatches} mismatches")
+    return mismatches == 0
+
+# Random NPC population with string reputations and actions, as a game would hold them
+def random_population(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return (
+        rng.random(count) < 0.7,
+        rng.random(count) < 0.5,
+        rng.choice(np.array(['good', 'bad', 'neutral']), count),
+        rng.random(count) < 0.5,
+        rng.choice(np.array(['kind', 'aggressive', 'ignores']), count),
+        rng.random(count) < 0.5,
+    )
+
+# Compare NPCs/sec of the scalar function, the batch API on string columns and on pre-encoded columns
+def benchmark(count=1000000, seed=0):
+    columns = random_population(count, seed)
+    rows = list(zip(*(column.tolist() for column in columns)))
+
+    start = time.perf_counter()
+    scalar = [char_interaction(*row) for row in rows]
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    codes = char_interaction_batch(*columns)
+    batch_seconds = time.perf_counter() - start
+
+    encoded = list(columns)
+    encoded[2] = encode_category(columns[2], REP_VALUES)
+    encoded[4] = encode_category(columns[4], ACTION_VALUES)
+    start = time.perf_counter()
+    char_interaction_batch(*encoded)
+    encoded_seconds = time.perf_counter() - start
+
+    matches = decode_responses(codes).tolist() == scalar
+    print(f"{count} NPCs, results match: {matches}")
+    for label, seconds in (("scalar char_interaction", scalar_seconds),
+                           ("batch, string columns", batch_seconds),
+                           ("batch, encoded columns", encoded_seconds)):
+        print(f"{label}: {seconds:.3f}s ({count / seconds:,.0f} NPCs/sec)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decide how a character responds to the player.")
+    parser.add_argument('--verify', action='store_true', help="Check the compiled table on every input combination")
+    parser.add_argument('--benchmark', action='store_true', help="Compare NPCs/sec of scalar and batch evaluation")
+    parser.add_argument('--npcs', type=int, default=1000000, help="Population size for --benchmark")
+    args = parser.parse_args()
+
+    if args.verify:
+        raise SystemExit(0 if verify_compiled() else 1)
+    if args.benchmark:
+        benchmark(args.npcs)
+        raise SystemExit
+
+    # Testing the function with specified parameters
+    response = char_interaction(
+        enter_room=True,
+        knows_player=False,
+        rep='good',
+        has_item=False,
+        action='kind',
+        apologizes=True
+    )
+    print(response) # Output the character's response based on the inputs
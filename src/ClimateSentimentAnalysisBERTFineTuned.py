@@ -9,68 +9,324 @@
 #
 # Setup: Python installed, with 'datasets/climatebert-climate-sentiment.csv' in your directory. 
 # Install Transformers and Datasets libraries using 'pip install transformers datasets'.
+#
+# Usage: 'python ClimateSentimentAnalysisBERTFineTuned.py' trains on examples padded to 512 tokens.
+# '--dynamic-padding' tokenizes without padding, pads each batch to its longest example and groups
+# examples of similar length into the same batch. '--benchmark-padding' trains one epoch each way
+# and compares tokens/sec and wall-clock time.
+#
+# Tokenized datasets are cached as Arrow shards under '../cache/tokenized', keyed by the source file's
+# hash, the tokenizer name, max_length and padding mode. Later runs memory-map the cached shards
+# instead of re-tokenizing the CSV; pass '--no-cache' to always tokenize from scratch.
+#
+# After training the model is saved to '../results/climate-sentiment-final'. '--score texts.csv' (or a
+# .jsonl file) streams texts through that model in batches under torch.inference_mode and writes one
+# JSON prediction per line to '--output', e.g. '--score texts.csv --batch-size 64 --num-threads 8'.
+#
+# '--export-quantized' writes an int8 copy of the fine-tuned model (dynamic quantization of every Linear
+# layer) to '../results/climate-sentiment-int8'; add '--quantized' to '--score' to use it.
+# '--benchmark-quantization' compares latency, throughput, size on disk and accuracy of both models
+# on the held-out eval split.
+
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import random
+import shutil
+import time
+
+import torch
 
 from transformers import BertTokenizer, BertForSequenceClassification, Trainer, TrainingArguments, pipeline
-from datasets import load_dataset
+from transformers import BertConfig, DataCollatorWithPadding
+from datasets import load_dataset, load_from_disk
+
+MODEL_NAME = 'bert-base-uncased'
+MAX_LENGTH = 512
+CACHE_DIRECTORY = '../cache/tokenized'
+FINETUNED_MODEL_PATH = '../results/climate-sentiment-final'
+QUANTIZED_MODEL_PATH = '../results/climate-sentiment-int8'
+QUANTIZED_WEIGHTS_FILE = 'quantized_model.pt'
+
+# Hash a file in blocks so large CSVs never have to fit in memory
+def file_hash(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
 # Load dataset and prepare for training
-def load_and_prepare_data(file_path):
-    # Load and tokenize custom climate dataset
-    dataset = load_dataset('csv', data_files={'train': file_path})
-    tokenized_datasets = dataset.map(tokenize_dataset, batched=True)
-    return tokenized_datasets
+def load_and_prepare_data(file_path, dynamic_padding=False, cache_dir=CACHE_DIRECTORY):
+    tokenize = tokenize_dataset_dynamic if dynamic_padding else tokenize_dataset
+    if cache_dir is None:
+        # Load and tokenize custom climate dataset
+        dataset = load_dataset('csv', data_files={'train': file_path})
+        return dataset.map(tokenize, batched=True)
+
+    # Any change to the data, tokenizer, max_length or padding mode gets its own cache entry
+    padding_mode = 'dynamic' if dynamic_padding else 'max_length'
+    key = f"{file_hash(file_path)}|{tokenizer.name_or_path}|{MAX_LENGTH}|{padding_mode}"
+    cache_path = os.path.join(cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest()[:16])
+
+    if not os.path.isdir(cache_path):
+        dataset = load_dataset('csv', data_files={'train': file_path})
+        tokenized_datasets = dataset.map(tokenize, batched=True)
+        # Write to a temporary directory first so an interrupted run never leaves a partial cache
+        staging_path = cache_path + '.tmp'
+        shutil.rmtree(staging_path, ignore_errors=True)
+        tokenized_datasets.save_to_disk(staging_path, max_shard_size='500MB')
+        os.replace(staging_path, cache_path)
+
+    # load_from_disk memory-maps the Arrow shards rather than reading them into RAM
+    return load_from_disk(cache_path)
 
 # Tokenize text data for BERT
 def tokenize_dataset(examples):
     # Returns tokenized examples with padding and truncation
-    return tokenizer(examples['text'], padding="max_length", truncation=True, max_length=512)
+    return tokenizer(examples['text'], padding="max_length", truncation=True, max_length=MAX_LENGTH)
+
+# Tokenize text data for BERT, leaving padding to the data collator
+def tokenize_dataset_dynamic(examples):
+    # Returns unpadded examples plus a 'length' column used to group similar lengths into batches
+    return tokenizer(examples['text'], truncation=True, max_length=MAX_LENGTH, return_length=True)
 
 # Select training and evaluation subsets
-def select_subsets(tokenized_datasets, subset_size_ratio=0.8):
-    # Splits dataset into training and evaluation sets
+def select_subsets(tokenized_datasets, subset_size_ratio=0.8, seed=42):
+    # Splits dataset into training and evaluation sets taken from one shuffled index
     subset_size = min(1000, len(tokenized_datasets['train']))
     train_size = int(subset_size * subset_size_ratio)
-    small_train_dataset = tokenized_datasets['train'].shuffle(seed=42).select(range(train_size))
-    small_eval_dataset = tokenized_datasets['train'].shuffle(seed=42).select(range(train_size, subset_size))
+    indices = random.Random(seed).sample(range(len(tokenized_datasets['train'])), subset_size)
+    small_train_dataset = tokenized_datasets['train'].select(indices[:train_size])
+    small_eval_dataset = tokenized_datasets['train'].select(indices[train_size:])
     return small_train_dataset, small_eval_dataset
 
 # Initialize and return the Trainer
-def initialize_trainer(train_dataset, eval_dataset):
+def initialize_trainer(train_dataset, eval_dataset, dynamic_padding=False, num_train_epochs=5, trainer_model=None):
     # Configures trainer with model and training arguments
     training_args = TrainingArguments(
         output_dir="../results",
         learning_rate=2e-5,
         per_device_train_batch_size=8,
         per_device_eval_batch_size=8,
-        num_train_epochs=5,
+        num_train_epochs=num_train_epochs,
         weight_decay=0.01,
         evaluation_strategy="epoch",
+        # Batch examples of similar length together so dynamic padding stays short
+        group_by_length=dynamic_padding,
+        length_column_name="length",
     )
     trainer = Trainer(
-        model=model,
+        model=trainer_model if trainer_model is not None else model,
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=eval_dataset,
+        # Pads each batch to its own longest example instead of a fixed 512 tokens
+        data_collator=DataCollatorWithPadding(tokenizer) if dynamic_padding else None,
     )
     return trainer
 
+# Train one epoch with fixed 512-token padding and one with dynamic padding, then compare
+def benchmark_padding(file_path, cache_dir=CACHE_DIRECTORY):
+    results = {}
+    for dynamic_padding in (False, True):
+        tokenized_datasets = load_and_prepare_data(file_path, dynamic_padding, cache_dir)
+        train_dataset, eval_dataset = select_subsets(tokenized_datasets)
+
+        # Start each run from the same pretrained weights
+        fresh_model = BertForSequenceClassification.from_pretrained(MODEL_NAME, num_labels=3)
+        trainer = initialize_trainer(train_dataset, eval_dataset, dynamic_padding,
+                                     num_train_epochs=1, trainer_model=fresh_model)
+
+        # Real tokens are the ones the attention mask keeps; padded ones are what the model computes on
+        real_tokens = sum(sum(mask) for mask in train_dataset['attention_mask'])
+        start = time.perf_counter()
+        trainer.train()
+        elapsed = time.perf_counter() - start
+
+        mode = "dynamic" if dynamic_padding else "fixed-512"
+        results[mode] = elapsed
+        print(f"{mode}: {elapsed:.1f}s per epoch, {real_tokens / elapsed:.0f} real tokens/sec "
+              f"over {len(train_dataset)} examples")
+
+    print(f"Dynamic padding speedup: {results['fixed-512'] / results['dynamic']:.2f}x")
+    return results
+
 # Evaluate model performance on test prompts
 def test_model_performance(sentiment_pipeline, prompts):
     # Prints predictions for each prompt
     for prompt in prompts:
         print(f"Prompt: {prompt}\nPrediction: {sentiment_pipeline(prompt)}\n")
 
+# Stream texts from a CSV or JSONL file without loading the whole file
+def read_texts(file_path, text_column='text'):
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        if file_path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)[text_column]
+        else:
+            for row in csv.DictReader(f):
+                yield row[text_column]
+
+# Group an iterable into lists of at most batch_size items
+def batched(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Nearest-rank percentile of a list of numbers
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered) / 100) - 1))]
+
+# Quantize every Linear layer to int8, with activation scales computed on the fly
+def quantize_model(fp32_model):
+    return torch.quantization.quantize_dynamic(fp32_model, {torch.nn.Linear}, dtype=torch.qint8)
+
+# Export an int8 copy of a fine-tuned model: its config and tokenizer plus the quantized weights
+def export_quantized_model(model_path=FINETUNED_MODEL_PATH, output_path=QUANTIZED_MODEL_PATH):
+    fp32_model = BertForSequenceClassification.from_pretrained(model_path).eval()
+    os.makedirs(output_path, exist_ok=True)
+    fp32_model.config.save_pretrained(output_path)
+    BertTokenizer.from_pretrained(model_path).save_pretrained(output_path)
+    torch.save(quantize_model(fp32_model).state_dict(), os.path.join(output_path, QUANTIZED_WEIGHTS_FILE))
+    return output_path
+
+# Rebuild the int8 architecture from the saved config, then load the exported weights into it
+def load_quantized_model(quantized_path=QUANTIZED_MODEL_PATH):
+    config = BertConfig.from_pretrained(quantized_path)
+    quantized_model = quantize_model(BertForSequenceClassification(config).eval())
+    state_dict = torch.load(os.path.join(quantized_path, QUANTIZED_WEIGHTS_FILE), weights_only=False)
+    quantized_model.load_state_dict(state_dict)
+    return quantized_model.eval()
+
+# Size on disk of the weight files in a model directory
+def weights_size(model_path):
+    return sum(os.path.getsize(os.path.join(model_path, name)) for name in os.listdir(model_path)
+               if name.endswith(('.bin', '.safetensors', '.pt')))
+
+# Classify one batch of texts, returning predicted label ids and their probabilities
+def classify_batch(classifier, classifier_tokenizer, texts):
+    inputs = classifier_tokenizer(texts, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors='pt')
+    probabilities = classifier(**inputs).logits.softmax(dim=-1)
+    scores, label_ids = probabilities.max(dim=-1)
+    return label_ids.tolist(), scores.tolist()
+
+# Compare the fp32 and int8 models on the held-out eval split
+def benchmark_quantization(dataset_path, model_path=FINETUNED_MODEL_PATH, quantized_path=QUANTIZED_MODEL_PATH,
+                           batch_size=32, cache_dir=CACHE_DIRECTORY):
+    _, eval_dataset = select_subsets(load_and_prepare_data(dataset_path, cache_dir=cache_dir))
+    texts, labels = eval_dataset['text'], eval_dataset['label']
+    benchmark_tokenizer = BertTokenizer.from_pretrained(model_path)
+    candidates = {
+        'fp32': (BertForSequenceClassification.from_pretrained(model_path).eval(), weights_size(model_path)),
+        'int8': (load_quantized_model(quantized_path), weights_size(quantized_path)),
+    }
+
+    predictions = {}
+    for name, (classifier, size) in candidates.items():
+        latencies = []
+        predictions[name] = []
+        with torch.inference_mode():
+            for batch in batched(texts, batch_size):
+                batch_start = time.perf_counter()
+                label_ids, _ = classify_batch(classifier, benchmark_tokenizer, batch)
+                latencies.append(time.perf_counter() - batch_start)
+                predictions[name].extend(label_ids)
+        accuracy = sum(p == l for p, l in zip(predictions[name], labels)) / len(labels)
+        print(f"{name}: {size / 2**20:.1f} MB on disk, p50 batch latency {percentile(latencies, 50) * 1000:.1f} ms, "
+              f"{len(texts) / sum(latencies):.1f} texts/sec, accuracy {accuracy:.3f}")
+
+    agreement = sum(a == b for a, b in zip(predictions['fp32'], predictions['int8'])) / len(texts)
+    print(f"int8/fp32 prediction agreement on {len(texts)} eval texts: {agreement:.3f}")
+    return predictions
+
+# Score a file of texts in batches, writing each prediction as soon as its batch is done
+def score_file(input_path, output_path, model_path=FINETUNED_MODEL_PATH, batch_size=64,
+               num_threads=None, text_column='text', quantized=False):
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    scoring_tokenizer = BertTokenizer.from_pretrained(model_path)
+    if quantized:
+        scoring_model = load_quantized_model(model_path)
+    else:
+        scoring_model = BertForSequenceClassification.from_pretrained(model_path).eval()
+    id2label = scoring_model.config.id2label
+
+    latencies = []
+    total_texts = 0
+    start = time.perf_counter()
+    with torch.inference_mode(), open(output_path, 'w', encoding='utf-8') as out:
+        for batch in batched(read_texts(input_path, text_column), batch_size):
+            batch_start = time.perf_counter()
+            label_ids, scores = classify_batch(scoring_model, scoring_tokenizer, batch)
+            for text, label_id, score in zip(batch, label_ids, scores):
+                out.write(json.dumps({'text': text, 'label': id2label[label_id], 'score': score}) + '\n')
+            latencies.append(time.perf_counter() - batch_start)
+            total_texts += len(batch)
+
+    elapsed = time.perf_counter() - start
+    if latencies:
+        print(f"Scored {total_texts} texts in {elapsed:.2f}s ({total_texts / elapsed:.1f} texts/sec, "
+              f"batch_size={batch_size}, threads={torch.get_num_threads()})")
+        print(f"Per-batch latency: p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+              f"p99 {percentile(latencies, 99) * 1000:.1f} ms")
+    return total_texts
+
 # Initialize tokenizer and model for BERT
-tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-model = BertForSequenceClassification.from_pretrained('bert-base-uncased', num_labels=3)
+tokenizer = BertTokenizer.from_pretrained(MODEL_NAME)
+model = BertForSequenceClassification.from_pretrained(MODEL_NAME, num_labels=3)
 
 # Main flow
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fine-tune BERT on climate sentiment data.")
+    parser.add_argument('--dynamic-padding', action='store_true',
+                        help="Pad each batch dynamically and group examples by length")
+    parser.add_argument('--benchmark-padding', action='store_true',
+                        help="Compare one epoch of fixed-512 and dynamic padding, then exit")
+    parser.add_argument('--no-cache', action='store_true', help="Re-tokenize instead of using the Arrow cache")
+    parser.add_argument('--score', metavar='INPUT', help="CSV or JSONL file of texts to classify, then exit")
+    parser.add_argument('--output', default='../results/predictions.jsonl', help="Where --score writes predictions")
+    parser.add_argument('--model-path', help="Model directory used by --score (defaults to the fp32 or int8 export)")
+    parser.add_argument('--quantized', action='store_true', help="Score with the int8 export")
+    parser.add_argument('--export-quantized', action='store_true', help="Write the int8 export, then exit")
+    parser.add_argument('--benchmark-quantization', action='store_true',
+                        help="Compare the fp32 model and int8 export on the eval split, then exit")
+    parser.add_argument('--text-column', default='text', help="Column or JSON field holding the text")
+    parser.add_argument('--batch-size', type=int, default=64, help="Texts per scoring batch")
+    parser.add_argument('--num-threads', type=int, help="Torch intra-op threads for scoring")
+    args = parser.parse_args()
+    cache_dir = None if args.no_cache else CACHE_DIRECTORY
     dataset_path = '../datasets/climatebert-climate-sentiment.csv'
-    tokenized_datasets = load_and_prepare_data(dataset_path)
+
+    if args.export_quantized:
+        print(f"Quantized model saved to '{export_quantized_model()}'")
+        raise SystemExit
+    if args.benchmark_quantization:
+        benchmark_quantization(dataset_path, cache_dir=cache_dir)
+        raise SystemExit
+    if args.score:
+        model_path = args.model_path or (QUANTIZED_MODEL_PATH if args.quantized else FINETUNED_MODEL_PATH)
+        score_file(args.score, args.output, model_path, args.batch_size, args.num_threads, args.text_column,
+                   args.quantized)
+        raise SystemExit
+    if args.benchmark_padding:
+        benchmark_padding(dataset_path, cache_dir)
+        raise SystemExit
+
+    tokenized_datasets = load_and_prepare_data(dataset_path, args.dynamic_padding, cache_dir)
     small_train_dataset, small_eval_dataset = select_subsets(tokenized_datasets)
 
-    trainer = initialize_trainer(small_train_dataset, small_eval_dataset)
+    trainer = initialize_trainer(small_train_dataset, small_eval_dataset, args.dynamic_padding)
     print("Before Training:")
     sentiment_pipeline_before = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
     
@@ -84,8 +340,10 @@ if __name__ == "__main__":
     
     test_model_performance(sentiment_pipeline_before, test_prompts)
     
-    # Train the model
+    # Train the model and keep it for batch scoring
     trainer.train()
+    trainer.save_model(FINETUNED_MODEL_PATH)
+    tokenizer.save_pretrained(FINETUNED_MODEL_PATH)
 
     print("After Training:")
     sentiment_pipeline_after = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
@@ -5,22 +5,149 @@
 # This code was autogenerated by GPT-4, from the following prompt:
 # Prompt: Count occurrences of 'percent' and 'carbon dioxide' in the 'text' column of the 'climatebert-netzero-reduction-data.csv'.
 #
-# About: This script counts occurrences of specific terms ('percent' and 'carbon dioxide') in a dataset and displays the results. 
+# About: This script counts occurrences of specific terms ('percent' and 'carbon dioxide') in a dataset and displays the results.
 # It uses Python's pandas library for data manipulation.
 #
-# Setup: Python installed, with 'climatebert-netzero-reduction-data.csv' in your directory. 
+# Setup: Python installed, with 'climatebert-netzero-reduction-data.csv' in your directory.
 # Install pandas using 'pip install pandas' for data processing.
+#
+# Usage: 'python Climatebert-AnalyzeCleansNormalize.py' counts the two default terms. Pass your own
+# with '--terms "net zero" scope' or '--terms-file terms.txt' (one term per line). All terms are
+# matched together by an Aho-Corasick automaton in a single pass over each text, and the CSV is
+# read in chunks, so the scan cost doesn't grow with the number of terms or the file size. With 'pip install
+# pyahocorasick' the automaton runs in C; without it, short term lists (up to PREFILTER_MAX_TERMS) first screen rows
+# with one compiled regex so only rows containing a term are walked character by character in Python.
 
-import pandas as pd
+import argparse
 import re
+from collections import deque
+
+import pandas as pd
+
+try:
+    import ahocorasick  # Optional C implementation of the automaton
+except ImportError:
+    ahocorasick = None
+
+DATASET_PATH = '../datasets/climatebert-netzero-reduction-data.csv'
+DEFAULT_TERMS = ['percent', 'carbon dioxide']
+# Python's re tries every alternative at every position, so the regex screen only pays off for a few terms
+PREFILTER_MAX_TERMS = 8
+
+# Aho-Corasick automaton: finds every occurrence of every term in one pass over a text
+class KeywordAutomaton:
+    def __init__(self, terms):
+        self.terms = list(terms)
+        self.transitions = [{}]  # Per state: character -> next state
+        self.fail = [0]          # Per state: longest proper suffix that is also a trie path
+        self.outputs = [()]      # Per state: indices of terms ending here
+
+        # Build the trie of all terms
+        for index, term in enumerate(self.terms):
+            if not term:
+                raise ValueError("Terms must be non-empty strings")
+            state = 0
+            for char in term:
+                next_state = self.transitions[state].get(char)
+                if next_state is None:
+                    next_state = len(self.transitions)
+                    self.transitions[state][char] = next_state
+                    self.transitions.append({})
+                    self.fail.append(0)
+                    self.outputs.append(())
+                state = next_state
+            self.outputs[state] += (index,)
+
+        # Breadth-first pass to set failure links and merge outputs from suffix states
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.transitions[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.transitions[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.outputs[next_state] += self.outputs[self.fail[next_state]]
+
+        # Fast paths: the C automaton when installed, otherwise (for short term lists) a regex that screens out
+        # rows without any term
+        self.native = None
+        if ahocorasick is not None:
+            self.native = ahocorasick.Automaton()
+            for index, term in enumerate(self.terms):
+                matches = self.native.get(term, ())
+                self.native.add_word(term, matches + (index,))
+            self.native.make_automaton()
+        self.prefilter = None
+        if len(self.terms) <= PREFILTER_MAX_TERMS:
+            self.prefilter = re.compile('|'.join(re.escape(term) for term in sorted(self.terms, key=len, reverse=True)))
+
+    # Returns {term index: number of occurrences} for a single text
+    def count(self, text):
+        if self.native is not None:
+            found = {}
+            for _, indexes in self.native.iter(text):
+                for index in indexes:
+                    found[index] = found.get(index, 0) + 1
+            return found
+        if self.prefilter is not None and not self.prefilter.search(text):
+            return {}
+        return self.count_python(text)
+
+    # Per-character walk of the Python automaton
+    def count_python(self, text):
+        transitions, fail, outputs = self.transitions, self.fail, self.outputs
+        found = {}
+        state = 0
+        for char in text:
+            while state and char not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(char, 0)
+            for index in outputs[state]:
+                found[index] = found.get(index, 0) + 1
+        return found
+
+# Count rows containing each term and total occurrences, reading the CSV in chunks
+def count_terms(file_path, terms, chunk_rows=100000, ignore_case=False):
+    if ignore_case:
+        terms = list(dict.fromkeys(term.lower() for term in terms))
+    automaton = KeywordAutomaton(terms)
+    row_counts = [0] * len(terms)
+    occurrence_counts = [0] * len(terms)
+
+    for chunk in pd.read_csv(file_path, usecols=['text'], chunksize=chunk_rows):
+        for text in chunk['text'].dropna().astype(str):
+            if ignore_case:
+                text = text.lower()
+            for index, occurrences in automaton.count(text).items():
+                row_counts[index] += 1
+                occurrence_counts[index] += occurrences
+
+    return {term: (row_counts[i], occurrence_counts[i]) for i, term in enumerate(terms)}
+
+# Read a term list, one term per line, skipping blanks and '#' comments
+def load_terms(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
 
-# Load the dataset
-data = pd.read_csv('../datasets/climatebert-netzero-reduction-data.csv')
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count terms in the 'text' column of a CSV in one pass.")
+    parser.add_argument('--input', default=DATASET_PATH, help="CSV file with a 'text' column")
+    parser.add_argument('--terms', nargs='+', help="Terms to count")
+    parser.add_argument('--terms-file', help="File with one term per line")
+    parser.add_argument('--chunk-rows', type=int, default=100000, help="CSV rows read per chunk")
+    parser.add_argument('--ignore-case', action='store_true', help="Match terms case-insensitively")
+    args = parser.parse_args()
 
-# Count occurrences of 'percent' and 'carbon dioxide' in 'text' column
-count_percent = data['text'].str.contains('percent').sum()
-count_carbon_dioxide = data['text'].str.contains('carbon dioxide').sum()
+    terms = list(args.terms or [])
+    if args.terms_file:
+        terms += load_terms(args.terms_file)
+    # Drop duplicates but keep the order the terms were given in
+    terms = list(dict.fromkeys(terms or DEFAULT_TERMS))
 
-# Display the results
-print(f"Occurrences of 'percent': {count_percent}")
-print(f"Occurrences of 'carbon dioxide': {count_carbon_dioxide}")
\ No newline at end of file
+    # Display the results
+    counts = count_terms(args.input, terms, args.chunk_rows, args.ignore_case)
+    for term, (rows, occurrences) in counts.items():
+        print(f"Occurrences of '{term}': {rows} rows, {occurrences} total matches")
@@ -8,27 +8,220 @@
 # About: This script anonymizes organization names in a text dataset using spaCy's NLP model
 # and then saves the modified data to a CSV file.
 #
-# Setup: Python installed, with 'climatebert-climate-detection.csv' in your directory. 
-# Install pandas and spaCy using 'pip install pandas spacy', then download the 
+# Setup: Python installed, with 'climatebert-climate-detection.csv' in your directory.
+# Install pandas and spaCy using 'pip install pandas spacy', then download the
 # spaCy model 'python -m spacy download en_core_web_sm'
+#
+# Usage: 'python Climatebert-Detection-EntityAnonymizer.py' anonymizes the dataset one row at a time.
+# Add '--batch' for large corpora: the CSV is streamed in chunks through a single 'nlp.pipe' with only the
+# components NER needs, e.g. '--batch --batch-size 256 --n-process 4 --chunk-rows 20000'.
+# Entity spans are cached per text in an SQLite file (see --cache), so a rerun only runs NER on
+# new or changed rows; pass --no-cache to disable it.
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+from collections import deque
 
 import spacy
 import pandas as pd
 
-# Load the dataset
-data = pd.read_csv('../datasets/climatebert-climate-detection.csv')
+INPUT_PATH = '../datasets/climatebert-climate-detection.csv'
+OUTPUT_PATH = '../datasets/anonymized_dataset.csv'
+CACHE_PATH = '../datasets/entity_cache.sqlite'
+MODEL_NAME = 'en_core_web_sm'  # Efficient small English model
+REDACTION = '[ANONYMIZED]'
+
+# Rebuild the text in one pass, swapping each ORG span for the redaction marker
+def redact_spans(text, spans, labels=('ORG',)):
+    pieces = []
+    cursor = 0
+    for start, end, label in spans:
+        if label not in labels or start < cursor:
+            continue
+        pieces.append(text[cursor:start])
+        pieces.append(REDACTION)
+        cursor = end
+    pieces.append(text[cursor:])
+    return ''.join(pieces)
+
+# Character offsets of every entity spaCy found, in document order
+def entity_spans(doc):
+    return [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+
+# Key texts by content so unchanged rows hit the cache on a rerun
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+# On-disk cache of entity spans per text, so reruns only run NER on new or changed rows
+class EntityCache:
+    def __init__(self, path, model_name=MODEL_NAME):
+        self.model_name = model_name
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entities ("
+            "text_hash TEXT NOT NULL, model TEXT NOT NULL, spans TEXT NOT NULL, "
+            "PRIMARY KEY (text_hash, model))"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    # Look up many hashes at once; returns {hash: spans} for the ones already cached
+    def get_many(self, hashes, query_size=500):
+        found = {}
+        hashes = list(hashes)
+        for i in range(0, len(hashes), query_size):
+            batch = hashes[i:i + query_size]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.connection.execute(
+                f"SELECT text_hash, spans FROM entities WHERE model = ? AND text_hash IN ({placeholders})",
+                [self.model_name, *batch],
+            )
+            for key, spans in rows:
+                found[key] = [tuple(span) for span in json.loads(spans)]
+        return found
+
+    def put_many(self, items):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO entities (text_hash, model, spans) VALUES (?, ?, ?)",
+            [(key, self.model_name, json.dumps(spans)) for key, spans in items],
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+# Load a pipeline stripped down to what NER needs
+def load_ner_pipeline(model_name=MODEL_NAME):
+    nlp = spacy.load(model_name)
+    # Remove from the end so no listener is left pointing at a removed tok2vec
+    for name in reversed(nlp.pipe_names):
+        if name == 'ner':
+            continue
+        if name == 'tok2vec' and 'ner' in getattr(nlp.get_pipe(name), 'listening_components', []):
+            continue  # NER shares this embedding layer, so it has to stay
+        nlp.remove_pipe(name)
+    return nlp
+
+# Anonymize a list of texts, running NER only on texts the cache hasn't seen
+def anonymize_texts(texts, nlp, cache=None, batch_size=128, n_process=1):
+    hashes = [text_hash(text) for text in texts]
+    spans_by_hash = cache.get_many(set(hashes)) if cache is not None else {}
+
+    # Each distinct uncached text goes through spaCy once
+    pending = {}
+    for key, text in zip(hashes, texts):
+        if key not in spans_by_hash:
+            pending.setdefault(key, text)
+    if pending:
+        docs = nlp.pipe(pending.values(), batch_size=batch_size, n_process=n_process)
+        computed = [(key, entity_spans(doc)) for key, doc in zip(pending, docs)]
+        spans_by_hash.update(computed)
+        if cache is not None:
+            cache.put_many(computed)
+    if cache is not None:
+        cache.misses += len(pending)
+        cache.hits += len(set(hashes)) - len(pending)
+
+    return [redact_spans(text, spans_by_hash[key]) for key, text in zip(hashes, texts)]
+
+# Original flow: anonymize organization names directly within the DataFrame
+def anonymize_in_memory(input_path, output_path, cache=None):
+    # Load the dataset
+    data = pd.read_csv(input_path)
+
+    # Load a pre-trained NLP model
+    nlp = spacy.load(MODEL_NAME)
+
+    # Update the text with anonymized version
+    data['text'] = anonymize_texts(data['text'].fillna('').astype(str).tolist(), nlp, cache)
+
+    # Save the anonymized dataset without the index
+    data.to_csv(output_path, index=False)
+
+# Batch flow: one nlp.pipe over the whole CSV, so with n_process > 1 the worker pool starts once rather than per chunk.
+# Chunks are read lazily, cached texts are skipped, and each chunk is written, in order, as soon as its last text is back
+def anonymize_in_batches(input_path, output_path, cache=None, batch_size=128, n_process=1, chunk_rows=10000):
+    nlp = load_ner_pipeline()
+    in_progress = deque()  # Chunks read but not written yet, oldest first
+    chunks_by_number = {}
+    written = {'chunks': 0, 'rows': 0}
+    start = time.perf_counter()
+
+    # Feed spaCy the distinct uncached texts of every chunk, tagged with (chunk number, text hash)
+    def uncached_texts():
+        for chunk_number, chunk in enumerate(pd.read_csv(input_path, chunksize=chunk_rows)):
+            texts = chunk['text'].fillna('').astype(str).tolist()
+            hashes = [text_hash(text) for text in texts]
+            spans_by_hash = cache.get_many(set(hashes)) if cache is not None else {}
+            pending = {}
+            for key, text in zip(hashes, texts):
+                if key not in spans_by_hash:
+                    pending.setdefault(key, text)
+            if cache is not None:
+                cache.misses += len(pending)
+                cache.hits += len(set(hashes)) - len(pending)
+            state = {'chunk': chunk, 'texts': texts, 'hashes': hashes, 'spans': spans_by_hash,
+                     'computed': [], 'remaining': len(pending)}
+            in_progress.append(state)
+            chunks_by_number[chunk_number] = state
+            for key, text in pending.items():
+                yield text, (chunk_number, key)
+
+    # Write every finished chunk at the front of the queue; the first one creates the file with a header
+    def write_finished_chunks():
+        while in_progress and in_progress[0]['remaining'] == 0:
+            state = in_progress.popleft()
+            if cache is not None and state['computed']:
+                cache.put_many(state['computed'])
+            chunk = state['chunk']
+            chunk['text'] = [redact_spans(text, state['spans'][key])
+                             for key, text in zip(state['hashes'], state['texts'])]
+            first = written['chunks'] == 0
+            chunk.to_csv(output_path, mode='w' if first else 'a', header=first, index=False)
+            written['chunks'] += 1
+            written['rows'] += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(f"Chunk {written['chunks']}: {written['rows']} rows, {written['rows'] / elapsed:.1f} rows/sec")
+
+    docs = nlp.pipe(uncached_texts(), as_tuples=True, batch_size=batch_size, n_process=n_process)
+    for doc, (chunk_number, key) in docs:
+        state = chunks_by_number[chunk_number]
+        spans = entity_spans(doc)
+        state['spans'][key] = spans
+        state['computed'].append((key, spans))
+        state['remaining'] -= 1
+        if state['remaining'] == 0:
+            del chunks_by_number[chunk_number]
+            write_finished_chunks()
+    write_finished_chunks()
 
-# Load a pre-trained NLP model
-nlp = spacy.load('en_core_web_sm')  # Efficient small English model
+    elapsed = time.perf_counter() - start
+    rate = written['rows'] / elapsed if elapsed > 0 else 0.0
+    print(f"Anonymized {written['rows']} rows in {elapsed:.2f}s ({rate:.1f} rows/sec, "
+          f"batch_size={batch_size}, n_process={n_process})")
 
-# Anonymize organization names directly within the DataFrame
-for idx, text in enumerate(data['text']):
-    doc = nlp(text)
-    anonymized_text = text
-    for ent in doc.ents:
-        if ent.label_ == 'ORG':  # Identify organization entities
-            anonymized_text = anonymized_text.replace(ent.text, '[ANONYMIZED]')
-    data.at[idx, 'text'] = anonymized_text  # Update the text with anonymized version
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replace ORG entities with '[ANONYMIZED]'.")
+    parser.add_argument('--input', default=INPUT_PATH, help="CSV file with a 'text' column")
+    parser.add_argument('--output', default=OUTPUT_PATH, help="Where to write the anonymized CSV")
+    parser.add_argument('--batch', action='store_true', help="Stream the CSV through nlp.pipe in chunks")
+    parser.add_argument('--batch-size', type=int, default=128, help="Texts per nlp.pipe batch")
+    parser.add_argument('--n-process', type=int, default=1, help="Worker processes for nlp.pipe")
+    parser.add_argument('--chunk-rows', type=int, default=10000, help="CSV rows read per chunk")
+    parser.add_argument('--cache', default=CACHE_PATH, help="SQLite file caching entity spans per text")
+    parser.add_argument('--no-cache', action='store_true', help="Run NER on every row")
+    args = parser.parse_args()
 
-# Save the anonymized dataset without the index
-data.to_csv('../datasets/anonymized_dataset.csv', index=False)
+    cache = None if args.no_cache else EntityCache(args.cache)
+    try:
+        if args.batch:
+            anonymize_in_batches(args.input, args.output, cache, args.batch_size, args.n_process, args.chunk_rows)
+        else:
+            anonymize_in_memory(args.input, args.output, cache)
+    finally:
+        if cache is not None:
+            print(f"Entity cache: {cache.hits} hits, {cache.misses} misses")
+            cache.close()
@@ -8,34 +8,98 @@
 # About: This script demonstrates the fine-tuning of the BERT model for MLM using a custom text dataset. It includes steps for loading the tokenizer and model, preparing the dataset by encoding text into suitable input formats, creating a PyTorch dataset for MLM, setting up training parameters, and initiating the training process with the Trainer class. The example showcases how to handle text data, split it into manageable chunks, mask tokens for MLM, and fine-tune a pre-trained BERT model to better understand and generate language based on the specific dataset.
 #
 # Setup: Ensure Python, PyTorch, and the transformers library are installed. The script requires a custom text dataset located at 'datasets/BK900687791.txt'. Install necessary libraries using 'pip install transformers torch'.
+#
+# The corpus is tokenized once, in a streaming pass, into token ids that are concatenated and packed into
+# fixed blocks of 'block_size' tokens with no padding. The blocks are written to '../cache/packed' and read
+# back through an np.memmap, so every epoch reads them from disk without holding the corpus in memory.
+
+import json
+import os
 
+import numpy as np
+import torch
 from transformers import BertTokenizer, BertForMaskedLM, Trainer, TrainingArguments
-from transformers import TextDataset, DataCollatorForLanguageModeling
+from transformers import DataCollatorForLanguageModeling
+
+PACKED_DIRECTORY = '../cache/packed'
+
+# Yield the corpus as pieces of whole lines of roughly read_chars characters, so words are never split
+def read_text_pieces(file_path, read_chars=1 << 20):
+    piece, size = [], 0
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            piece.append(line)
+            size += len(line)
+            if size >= read_chars:
+                yield ''.join(piece)
+                piece, size = [], 0
+    if piece:
+        yield ''.join(piece)
+
+# Tokenize the corpus once and write it as packed [CLS] ... [SEP] blocks of block_size tokens
+def pack_corpus(file_path, tokenizer, output_path, block_size=128):
+    body_size = block_size - 2  # Room for [CLS] and [SEP] in every block
+    dtype = np.uint16 if len(tokenizer) <= np.iinfo(np.uint16).max + 1 else np.int32
+    carry = []
+    num_blocks = 0
+    with open(output_path, 'wb') as out:
+        for piece in read_text_pieces(file_path):
+            carry.extend(tokenizer(piece, add_special_tokens=False)['input_ids'])
+            full = len(carry) // body_size
+            if full:
+                body = np.asarray(carry[:full * body_size], dtype=dtype).reshape(full, body_size)
+                blocks = np.empty((full, block_size), dtype=dtype)
+                blocks[:, 0] = tokenizer.cls_token_id
+                blocks[:, 1:-1] = body
+                blocks[:, -1] = tokenizer.sep_token_id
+                blocks.tofile(out)
+                num_blocks += full
+                carry = carry[full * body_size:]  # The tail too short for a block is carried over
+    return num_blocks, np.dtype(dtype).name
+
+# Pack the corpus unless an up-to-date packed copy is already on disk
+def load_packed_blocks(file_path, tokenizer, block_size=128, packed_dir=PACKED_DIRECTORY):
+    os.makedirs(packed_dir, exist_ok=True)
+    blocks_path = os.path.join(packed_dir, f"{os.path.basename(file_path)}.{block_size}.bin")
+    meta_path = blocks_path + '.json'
+    source = os.stat(file_path)
+    expected = {'source_size': source.st_size, 'source_mtime': source.st_mtime,
+                'tokenizer': tokenizer.name_or_path, 'block_size': block_size}
+
+    meta = None
+    if os.path.exists(meta_path) and os.path.exists(blocks_path):
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    if meta is None or any(meta.get(key) != value for key, value in expected.items()):
+        num_blocks, dtype = pack_corpus(file_path, tokenizer, blocks_path, block_size)
+        meta = dict(expected, num_blocks=num_blocks, dtype=dtype)
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
 
-def fine_tune_bert(book_path, model_name='bert-base-uncased'):
+    if meta['num_blocks'] == 0:
+        raise ValueError(f"'{file_path}' is shorter than one block of {block_size} tokens")
+    # Copy-on-write mapping: pages are read from disk on demand and never written back
+    return np.memmap(blocks_path, dtype=meta['dtype'], mode='c', shape=(meta['num_blocks'], block_size))
+
+# PyTorch dataset over the packed blocks; each item is one row of the memory-mapped array
+class PackedBlockDataset(torch.utils.data.Dataset):
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __getitem__(self, index):
+        # Only this block is widened to the int64 ids the model and loss expect
+        return {'input_ids': torch.from_numpy(self.blocks[index].astype(np.int64))}
+
+def fine_tune_bert(book_path, model_name='bert-base-uncased', block_size=128):
     # Load the tokenizer and model
     tokenizer = BertTokenizer.from_pretrained(model_name)
     model = BertForMaskedLM.from_pretrained(model_name)
 
-    # Prepare dataset
-    def encode_book(file_path):
-        examples = []
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-        # Split the text into chunks of 512 tokens
-        chunks = [text[i:i+512] for i in range(0, len(text), 512)]
-        for chunk in chunks:
-            examples.append(tokenizer(chunk, truncation=True, padding='max_length', max_length=512))
-        return examples
-
-    examples = encode_book(book_path)
-    
-    # Create a PyTorch dataset
-    dataset = TextDataset(
-        tokenizer=tokenizer,
-        file_path=book_path,
-        block_size=128
-    )
+    # Create a PyTorch dataset from the packed, memory-mapped token blocks
+    dataset = PackedBlockDataset(load_packed_blocks(book_path, tokenizer, block_size))
     
     data_collator = DataCollatorForLanguageModeling(
         tokenizer=tokenizer, 
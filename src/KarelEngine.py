@@ -0,0 +1,387 @@
+# Source: "Think Artificial Intelligence" by Jerry Cuomo, 2024
+# Purpose: Educational code examples from the book.
+# Copyright © 2024 Jerry Cuomo. All rights reserved.
+#
+# About: A small Karel the Robot engine for running programs such as DecisionBasedNavigation.kl without an external
+# Karel environment. A .kl program is parsed and compiled into compact bytecode, with DEFINE procedures (turnRight,
+# checkAndTurn, ...) inlined at their call sites, and run against grid worlds held in NumPy arrays: a wall bitmask and
+# a beeper count per cell. A world stops Karel (the 'off' condition becomes true) once it reaches the world's exit
+# cell. Programs that never stop are caught two ways: the world state is hashed at every backward jump, so a
+# repeated state means an infinite loop, and a step limit bounds everything else.
+#
+# Usage: 'python KarelEngine.py DecisionBasedNavigation.kl --worlds 20000 --processes 4' runs the program over 20,000
+# random worlds on a process pool and reports outcomes, worlds/sec and steps/sec. '--disassemble' prints the bytecode.
+#
+# Setup: Python installed, with NumPy ('pip install numpy').
+
+import argparse
+import re
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Opcodes; every instruction is three ints (opcode, a, b) in one flat array
+MOVE, TURN_LEFT, PICK_BEEPER, PUT_BEEPER, TURN_OFF, JUMP, JUMP_IF_NOT, PUSH_COUNT, COUNT_DOWN, HALT = range(10)
+OPCODE_NAMES = ('MOVE', 'TURN_LEFT', 'PICK_BEEPER', 'PUT_BEEPER', 'TURN_OFF', 'JUMP', 'JUMP_IF_NOT', 'PUSH_COUNT',
+                'COUNT_DOWN', 'HALT')
+PRIMITIVES = {'move': MOVE, 'turnleft': TURN_LEFT, 'pickbeeper': PICK_BEEPER, 'putbeeper': PUT_BEEPER,
+              'turnoff': TURN_OFF}
+
+# Conditions are encoded as (test * 2 + negated); the 'blocked'/'not' spellings are negations of these tests
+CONDITIONS = ('frontisclear', 'leftisclear', 'rightisclear', 'facingnorth', 'facingeast', 'facingsouth',
+              'facingwest', 'nexttoabeeper', 'anybeepersinbeeperbag', 'off')
+NEGATED_CONDITIONS = {'frontisblocked': 'frontisclear', 'leftisblocked': 'leftisclear',
+                      'rightisblocked': 'rightisclear', 'notfacingnorth': 'facingnorth',
+                      'notfacingeast': 'facingeast', 'notfacingsouth': 'facingsouth', 'notfacingwest': 'facingwest',
+                      'notnexttoabeeper': 'nexttoabeeper', 'nobeepersinbeeperbag': 'anybeepersinbeeperbag'}
+
+# Directions: north, east, south, west; a wall bit (1 << direction) on a cell blocks moving that way
+ROW_STEP = (-1, 0, 1, 0)
+COLUMN_STEP = (0, 1, 0, -1)
+
+# Outcomes of running a program in one world
+TURNED_OFF, INFINITE_LOOP, STEP_LIMIT, ERROR_SHUTOFF, NO_TURNOFF = ('turned_off', 'infinite_loop', 'step_limit',
+                                                                    'error_shutoff', 'ended_without_turnoff')
+
+# Program markers from the classic Karel syntax, accepted and ignored
+MARKERS = {'beginning-of-program', 'beginning-of-execution', 'end-of-execution', 'end-of-program'}
+
+# Split a .kl program into lowercase tokens, dropping '#' comments
+def tokenize(source):
+    source = re.sub(r'#[^\n]*', '', source)
+    return [token.lower() for token in re.findall(r'[A-Za-z_][\w-]*|\d+|;', source)
+            if token.lower() not in MARKERS]
+
+# Recursive-descent parser producing nested tuples; DEFINE bodies are kept by name for inlining
+class Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.procedures = {}
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, *expected):
+        token = self.peek()
+        if token is None or (expected and token not in expected):
+            raise ValueError(f"Expected {' or '.join(expected) or 'a token'} at token {self.position}, got {token!r}")
+        self.position += 1
+        return token
+
+    def skip_separators(self):
+        while self.peek() == ';':
+            self.position += 1
+
+    def parse_program(self):
+        main = []
+        self.skip_separators()
+        while self.peek() is not None:
+            if self.peek() in ('define', 'define-new-instruction'):
+                self.take()
+                name = self.take()
+                self.take('as')
+                if name in self.procedures or name in PRIMITIVES:
+                    raise ValueError(f"Procedure {name!r} is already defined")
+                self.procedures[name] = self.parse_statement()
+            else:
+                main.append(self.parse_statement())
+            self.skip_separators()
+        return ('block', main)
+
+    def parse_statement(self):
+        token = self.take()
+        if token == 'begin':
+            statements = []
+            self.skip_separators()
+            while self.peek() != 'end':
+                statements.append(self.parse_statement())
+                self.skip_separators()
+            self.take('end')
+            return ('block', statements)
+        if token == 'if':
+            condition = self.parse_condition()
+            self.take('then')
+            then_branch = self.parse_statement()
+            # An optional ';' may separate the THEN branch from its ELSE
+            if self.peek() == ';' and self.position + 1 < len(self.tokens) and self.tokens[self.position + 1] == 'else':
+                self.take(';')
+            else_branch = None
+            if self.peek() == 'else':
+                self.take('else')
+                else_branch = self.parse_statement()
+            return ('if', condition, then_branch, else_branch)
+        if token == 'while':
+            condition = self.parse_condition()
+            self.take('do', 'then')
+            return ('while', condition, self.parse_statement())
+        if token == 'iterate':
+            count = self.take()
+            if not count.isdigit():
+                raise ValueError(f"ITERATE needs a number, got {count!r}")
+            self.take('times')
+            return ('iterate', int(count), self.parse_statement())
+        if token == ';' or token in ('end', 'then', 'else', 'do', 'as'):
+            raise ValueError(f"Unexpected {token!r} at token {self.position - 1}")
+        return ('call', token)
+
+    def parse_condition(self):
+        negated = False
+        while self.peek() == 'not':
+            self.take('not')
+            negated = not negated
+        name = self.take()
+        if name in NEGATED_CONDITIONS:
+            name, negated = NEGATED_CONDITIONS[name], not negated
+        if name not in CONDITIONS:
+            raise ValueError(f"Unknown condition {name!r}")
+        return CONDITIONS.index(name) * 2 + negated
+
+# Compile the parsed program to flat bytecode, inlining every procedure call
+def compile_program(source):
+    parser = Parser(tokenize(source))
+    main = parser.parse_program()
+    code = []
+
+    def emit(opcode, a=0, b=0):
+        code.extend((opcode, a, b))
+        return len(code) - 3
+
+    def compile_node(node, inlining):
+        kind = node[0]
+        if kind == 'block':
+            for statement in node[1]:
+                compile_node(statement, inlining)
+        elif kind == 'call':
+            name = node[1]
+            if name in PRIMITIVES:
+                emit(PRIMITIVES[name])
+            elif name in parser.procedures:
+                if name in inlining:
+                    raise ValueError(f"Procedure {name!r} calls itself and can't be inlined")
+                compile_node(parser.procedures[name], inlining | {name})
+            else:
+                raise ValueError(f"Unknown instruction {name!r}")
+        elif kind == 'if':
+            _, condition, then_branch, else_branch = node
+            branch = emit(JUMP_IF_NOT, condition)
+            compile_node(then_branch, inlining)
+            if else_branch is None:
+                code[branch + 2] = len(code)
+            else:
+                skip_else = emit(JUMP)
+                code[branch + 2] = len(code)
+                compile_node(else_branch, inlining)
+                code[skip_else + 1] = len(code)
+        elif kind == 'while':
+            _, condition, body = node
+            top = emit(JUMP_IF_NOT, condition)
+            compile_node(body, inlining)
+            emit(JUMP, top)
+            code[top + 2] = len(code)
+        elif kind == 'iterate':
+            _, count, body = node
+            emit(PUSH_COUNT, count)
+            top = emit(COUNT_DOWN)
+            compile_node(body, inlining)
+            emit(JUMP, top)
+            code[top + 1] = len(code)
+
+    compile_node(main, frozenset())
+    emit(HALT)
+    return array('i', code)
+
+# Human-readable listing of the bytecode
+def disassemble(code):
+    lines = []
+    for offset in range(0, len(code), 3):
+        opcode, a, b = code[offset:offset + 3]
+        name = OPCODE_NAMES[opcode]
+        if opcode == JUMP_IF_NOT:
+            condition = ('not ' if a & 1 else '') + CONDITIONS[a >> 1]
+            lines.append(f"{offset:5d}  {name:<12}{condition} -> {b}")
+        elif opcode in (JUMP, COUNT_DOWN):
+            lines.append(f"{offset:5d}  {name:<12}-> {a}")
+        elif opcode == PUSH_COUNT:
+            lines.append(f"{offset:5d}  {name:<12}{a}")
+        else:
+            lines.append(f"{offset:5d}  {name}")
+    return "\n".join(lines)
+
+# A grid world: wall bitmask and beeper count per cell, Karel's start, and the exit cell that stops Karel
+class World:
+    def __init__(self, walls, beepers, start, direction, exit_cell, bag=0):
+        self.walls = walls
+        self.beepers = beepers
+        self.start = start
+        self.direction = direction
+        self.exit_cell = exit_cell
+        self.bag = bag
+
+# Random world; interior walls are placed between neighbouring cells with probability wall_density
+def random_world(rows, columns, seed, wall_density=0.25, beeper_density=0.05):
+    rng = np.random.default_rng(seed)
+    walls = np.zeros((rows, columns), dtype=np.uint8)
+    walls[0, :] |= 1 << 0
+    walls[:, -1] |= 1 << 1
+    walls[-1, :] |= 1 << 2
+    walls[:, 0] |= 1 << 3
+    east = rng.random((rows, columns - 1)) < wall_density
+    walls[:, :-1] |= (east * (1 << 1)).astype(np.uint8)
+    walls[:, 1:] |= (east * (1 << 3)).astype(np.uint8)
+    south = rng.random((rows - 1, columns)) < wall_density
+    walls[:-1, :] |= (south * (1 << 2)).astype(np.uint8)
+    walls[1:, :] |= (south * (1 << 0)).astype(np.uint8)
+    beepers = (rng.random((rows, columns)) < beeper_density).astype(np.int32)
+    start, exit_cell = rng.choice(rows * columns, size=2, replace=False)
+    return World(walls, beepers, divmod(int(start), columns), int(rng.integers(4)), divmod(int(exit_cell), columns))
+
+# Run bytecode in a world; returns (outcome, steps). The world's arrays are not modified
+def run(code, world, step_limit=100000):
+    rows, columns = world.walls.shape
+    walls = world.walls.ravel().tolist()
+    beepers = world.beepers.ravel().tolist()
+    row, column = world.start
+    cell = row * columns + column
+    exit_cell = world.exit_cell[0] * columns + world.exit_cell[1]
+    direction = world.direction
+    bag = world.bag
+    off = cell == exit_cell
+    counters = []
+    beeper_state = None  # Snapshot of the beepers, refreshed only when a beeper is picked or put
+    seen = set()
+    code = code.tolist() if isinstance(code, array) else code
+    pc = 0
+    steps = 0
+
+    while steps < step_limit:
+        opcode = code[pc]
+        steps += 1
+        if opcode == JUMP_IF_NOT:
+            test = code[pc + 1]
+            kind = test >> 1
+            if kind == 0:
+                value = not walls[cell] & (1 << direction)
+            elif kind == 1:
+                value = not walls[cell] & (1 << ((direction + 3) & 3))
+            elif kind == 2:
+                value = not walls[cell] & (1 << ((direction + 1) & 3))
+            elif kind <= 6:
+                value = direction == kind - 3
+            elif kind == 7:
+                value = beepers[cell] > 0
+            elif kind == 8:
+                value = bag > 0
+            else:
+                value = off
+            if value == bool(test & 1):
+                pc = code[pc + 2]
+            else:
+                pc += 3
+        elif opcode == JUMP:
+            target = code[pc + 1]
+            if target < pc:
+                # Every infinite run passes backward jumps forever, so hashing the state here catches it
+                state = (target, cell, direction, bag, off, tuple(counters), beeper_state)
+                if state in seen:
+                    return INFINITE_LOOP, steps
+                seen.add(state)
+            pc = target
+        elif opcode == MOVE:
+            if walls[cell] & (1 << direction):
+                return ERROR_SHUTOFF, steps
+            cell += ROW_STEP[direction] * columns + COLUMN_STEP[direction]
+            if cell == exit_cell:
+                off = True
+            pc += 3
+        elif opcode == TURN_LEFT:
+            direction = (direction + 3) & 3
+            pc += 3
+        elif opcode == TURN_OFF:
+            return TURNED_OFF, steps
+        elif opcode == COUNT_DOWN:
+            if counters[-1] == 0:
+                counters.pop()
+                pc = code[pc + 1]
+            else:
+                counters[-1] -= 1
+                pc += 3
+        elif opcode == PUSH_COUNT:
+            counters.append(code[pc + 1])
+            pc += 3
+        elif opcode == PICK_BEEPER:
+            if beepers[cell] == 0:
+                return ERROR_SHUTOFF, steps
+            beepers[cell] -= 1
+            bag += 1
+            beeper_state = tuple(beepers)
+            pc += 3
+        elif opcode == PUT_BEEPER:
+            if bag == 0:
+                return ERROR_SHUTOFF, steps
+            beepers[cell] += 1
+            bag -= 1
+            beeper_state = tuple(beepers)
+            pc += 3
+        else:
+            return NO_TURNOFF, steps
+    return STEP_LIMIT, steps
+
+# Worker: run the program over a contiguous range of world seeds; worlds are rebuilt from seeds, not pickled
+def run_seed_range(code, first_seed, count, rows, columns, wall_density, step_limit):
+    outcomes = Counter()
+    total_steps = 0
+    for seed in range(first_seed, first_seed + count):
+        outcome, steps = run(code, random_world(rows, columns, seed, wall_density), step_limit)
+        outcomes[outcome] += 1
+        total_steps += steps
+    return outcomes, total_steps
+
+# Evaluate one program over many random worlds across a process pool
+def evaluate(code, worlds=10000, rows=8, columns=8, wall_density=0.25, step_limit=100000, processes=4,
+             seed=0, chunk_worlds=500):
+    ranges = [(seed + first, min(chunk_worlds, worlds - first)) for first in range(0, worlds, chunk_worlds)]
+    args = [(code, first, count, rows, columns, wall_density, step_limit) for first, count in ranges]
+    outcomes = Counter()
+    total_steps = 0
+    start = time.perf_counter()
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(run_seed_range, *zip(*args)))
+    else:
+        results = [run_seed_range(*arguments) for arguments in args]
+    for chunk_outcomes, chunk_steps in results:
+        outcomes.update(chunk_outcomes)
+        total_steps += chunk_steps
+    elapsed = time.perf_counter() - start
+    return outcomes, total_steps, elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a Karel program over many random grid worlds.")
+    parser.add_argument('program', nargs='?', default='DecisionBasedNavigation.kl', help=".kl program to run")
+    parser.add_argument('--worlds', type=int, default=10000, help="Number of random worlds")
+    parser.add_argument('--rows', type=int, default=8, help="World height")
+    parser.add_argument('--columns', type=int, default=8, help="World width")
+    parser.add_argument('--wall-density', type=float, default=0.25, help="Chance of a wall between two cells")
+    parser.add_argument('--step-limit', type=int, default=100000, help="Instructions allowed per world")
+    parser.add_argument('--processes', type=int, default=4, help="Worker processes (1 runs inline)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the first world")
+    parser.add_argument('--disassemble', action='store_true', help="Print the compiled bytecode and exit")
+    args = parser.parse_args()
+
+    with open(args.program, 'r', encoding='utf-8') as f:
+        code = compile_program(f.read())
+    if args.disassemble:
+        print(disassemble(code))
+        raise SystemExit
+
+    outcomes, total_steps, elapsed = evaluate(code, args.worlds, args.rows, args.columns, args.wall_density,
+                                              args.step_limit, args.processes, args.seed)
+    print(f"{args.program}: {len(code) // 3} instructions, {args.worlds} worlds of {args.rows}x{args.columns}")
+    for outcome, count in outcomes.most_common():
+        print(f"  {outcome}: {count} ({count / args.worlds:.1%})")
+    print(f"{total_steps} steps in {elapsed:.2f}s ({args.worlds / elapsed:,.0f} worlds/sec, "
+          f"{total_steps / elapsed:,.0f} steps/sec, processes={args.processes})")
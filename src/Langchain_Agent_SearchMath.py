@@ -7,28 +7,300 @@
 # About: This script implements a LangChain agent capable of autonomously processing various inputs by utilizing a dynamic toolchain. This includes a web search tool for data retrieval, a math calculator for numerical analysis, and a large language model (LLM) for generating comprehensive responses. The example provided demonstrates querying global solar power output in 2023, showcasing the agent's versatility in handling both factual data retrieval and complex computation.
 # Setup: Ensure a Python environment with LangChain, LangChain-OpenAI, and necessary web search and math calculation tools installed. API keys for OpenAI and web search services must be securely configured. This setup enables the LangChain agent to leverage external data sources and LLM capabilities to process and respond to inquiries effectively.
 # Note: The script also utilizes SERPAPI for search functionality, demonstrating a comprehensive approach to response generation and evaluation.
+#
+# Usage: 'python Langchain_Agent_SearchMath.py' runs the query below. The Calculator tool evaluates plain arithmetic
+# locally (no model round trip) and only hands an input to the 'llm-math' chain when it can't parse it; search results
+# are cached in SQLite (see --search-cache), so a repeated search costs no API call. '--llm-math' restores the original
+# tools. '--benchmark' runs a scripted set of queries against local stand-ins for SERPAPI and the LLM, with the original
+# and the local tools, and reports agent steps, LLM calls, search calls and latency; no API keys are needed for it.
 
 # Import necessary packages from LangChain and set up environment variables for API keys
-from langchain.agents import AgentType, initialize_agent, load_tools
+from langchain.agents import AgentType, Tool, initialize_agent, load_tools
+from langchain_core.language_models.llms import LLM
 from langchain_openai import OpenAI
+import argparse
+import ast
+import math
+import operator
 import os
+import re
+import sqlite3
+import tempfile
+import time
+
+SEARCH_CACHE_PATH = "../cache/search_results.sqlite"
 
 # Set OpenAI and SERPAPI API keys (ensure these are securely managed and not hard-coded in production)
 os.environ["OPENAI_API_KEY"] = "INSERT_OPENAI_API_KEY_HERE"
 os.environ["SERPAPI_API_KEY"] = "INSERT_SERPAPI_KEY_HERE"
 
-# Initialize the OpenAI agent with a specific temperature setting
-llm = OpenAI(temperature=.7)
+# Operators, functions and constants the local calculator accepts; anything else goes to the LLM
+BINARY_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+FUNCTIONS = {
+    "abs": abs, "round": round, "min": min, "max": max, "sqrt": math.sqrt, "exp": math.exp,
+    "log": math.log, "log10": math.log10, "sin": math.sin, "cos": math.cos, "tan": math.tan,
+}
+CONSTANTS = {"pi": math.pi, "e": math.e}
+MAX_EXPONENT = 1000
+MAX_RESULT_BITS = 10000  # About 3,000 digits; keeps big-integer work and formatting cheap
+GROUPED_NUMBER = re.compile(r"(?<![\d.])\d{1,3}(?:,\d{3})+(?!\d)")
+
+# Walk the parsed expression, allowing only numbers, arithmetic and the functions above
+def _evaluate(node):
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in CONSTANTS:
+        return CONSTANTS[node.id]
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return UNARY_OPERATORS[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left, right = _evaluate(node.left), _evaluate(node.right)
+        if isinstance(node.op, ast.Pow):
+            if abs(right) > MAX_EXPONENT:
+                raise ValueError("Exponent too large")
+            # Estimate the size before computing, so nested powers can't run away
+            if isinstance(left, int) and max(abs(left).bit_length(), 1) * abs(right) > MAX_RESULT_BITS:
+                raise ValueError("Result too large")
+        result = BINARY_OPERATORS[type(node.op)](left, right)
+        if isinstance(result, int) and result.bit_length() > MAX_RESULT_BITS:
+            raise ValueError("Result too large")
+        return _real(result)
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS
+            and not node.keywords):
+        return _real(FUNCTIONS[node.func.id](*[_evaluate(arg) for arg in node.args]))
+    raise ValueError(f"Unsupported expression: {ast.dump(node)}")
+
+# Complex, infinite and NaN values aren't answers the agent can use; let the LLM handle those inputs
+def _real(value):
+    if isinstance(value, complex) or (isinstance(value, float) and not math.isfinite(value)):
+        raise ValueError(f"Not a finite real number: {value}")
+    return value
+
+# Remove thousands separators ('1,600' -> '1600'), leaving commas inside a function call's arguments alone
+def strip_digit_grouping(text):
+    call_commas = set()
+    open_calls = []  # Per open parenthesis: does it start a function call's arguments?
+    for index, char in enumerate(text):
+        if char == "(":
+            open_calls.append(bool(re.search(r"\w\s*$", text[:index])))
+        elif char == ")" and open_calls:
+            open_calls.pop()
+        elif char == "," and any(open_calls):
+            call_commas.add(index)
+    pieces = []
+    position = 0
+    for match in GROUPED_NUMBER.finditer(text):
+        if any(match.start() + offset in call_commas for offset, char in enumerate(match.group()) if char == ","):
+            continue
+        pieces.append(text[position:match.start()])
+        pieces.append(match.group().replace(",", ""))
+        position = match.end()
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+# Safely evaluate an arithmetic expression such as '1,600 / 8.1' or '(3^2 + 4^2) ** 0.5'.
+# Raises ValueError when the input isn't plain arithmetic
+def evaluate_expression(expression):
+    text = expression.strip().strip("`'\"").strip()
+    text = strip_digit_grouping(text)
+    text = text.replace("^", "**").replace("×", "*").replace("÷", "/")
+    try:
+        result = _evaluate(ast.parse(text, mode="eval"))
+    except (SyntaxError, TypeError, ZeroDivisionError, OverflowError, RecursionError) as error:
+        raise ValueError(str(error)) from error
+    if isinstance(result, float) and result.is_integer() and abs(result) < 1e15:
+        result = int(result)
+    return result
+
+# Calculator tool that answers locally and only asks the llm-math chain when the input isn't plain arithmetic
+class LocalCalculator:
+    def __init__(self, fallback_tool=None):
+        self.fallback_tool = fallback_tool
+        self.local_answers = 0
+        self.fallbacks = 0
+
+    def run(self, expression):
+        try:
+            answer = f"Answer: {evaluate_expression(expression)}"  # Same shape as the llm-math chain's answer
+        except ValueError:
+            if self.fallback_tool is None:
+                raise
+            self.fallbacks += 1
+            return self.fallback_tool.run(expression)
+        self.local_answers += 1
+        return answer
+
+    def as_tool(self):
+        return Tool(
+            name="Calculator",
+            func=self.run,
+            description="Useful for when you need to answer questions about math. Input should be a numeric expression.",
+        )
+
+# SQLite cache of search results keyed by the normalized query, with an expiry so stale facts are refreshed
+class SearchCache:
+    def __init__(self, path=SEARCH_CACHE_PATH, ttl_seconds=24 * 3600):
+        self.ttl_seconds = ttl_seconds
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS searches (query TEXT PRIMARY KEY, created_at REAL NOT NULL, result TEXT NOT NULL)"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(query):
+        return " ".join(query.lower().split())
+
+    def run(self, query, search):
+        key = self._key(query)
+        now = time.time()
+        row = self.connection.execute("SELECT created_at, result FROM searches WHERE query = ?", (key,)).fetchone()
+        if row is not None and now - row[0] < self.ttl_seconds:
+            self.hits += 1
+            return row[1]
+        self.misses += 1
+        result = search(query)
+        self.connection.execute("INSERT OR REPLACE INTO searches (query, created_at, result) VALUES (?, ?, ?)",
+                                (key, now, result))
+        self.connection.commit()
+        return result
+
+    # Wrap a search tool so it keeps its name and description but answers repeats from the cache
+    def wrap(self, tool):
+        return Tool(name=tool.name, description=tool.description, func=lambda query: self.run(query, tool.run))
+
+    def close(self):
+        self.connection.close()
+
+# Build the agent's tools: original 'serpapi' + 'llm-math', or cached search + local calculator
+def build_tools(llm, search_tool=None, local_math=True, search_cache=None):
+    if search_tool is None:
+        search_tool = load_tools(["serpapi"], llm=llm)[0]
+    llm_math_tool = load_tools(["llm-math"], llm=llm)[0]
+    if not local_math:
+        return [search_tool, llm_math_tool]
+    if search_cache is not None:
+        search_tool = search_cache.wrap(search_tool)
+    return [search_tool, LocalCalculator(llm_math_tool).as_tool()]
+
+# Canned search results and agent transcripts used by --benchmark in place of SERPAPI and OpenAI
+LOCAL_SEARCH_RESULTS = {
+    "global solar power output 2023": "Solar generation reached about 1,600 TWh worldwide in 2023.",
+    "global wind power output 2023": "Wind turbines generated about 2,300 TWh worldwide in 2023.",
+    "world population 2023": "The world population was about 8.0 billion in 2023.",
+}
+BENCHMARK_SCRIPT = [
+    ("What was the total solar power output globally in 2023?", [
+        ("Search", "global solar power output 2023"),
+        ("Final Answer", "About 1,600 TWh."),
+    ]),
+    ("How much energy did wind and solar produce together in 2023?", [
+        ("Search", "global wind power output 2023"),
+        ("Search", "global solar power output 2023"),
+        ("Calculator", "2,300 + 1,600"),
+        ("Final Answer", "About 3,900 TWh."),
+    ]),
+    ("How much solar energy per person was produced in 2023, in kWh?", [
+        ("Search", "global solar power output 2023"),
+        ("Search", "world population 2023"),
+        ("Calculator", "1600e9 / 8.0e9"),
+        ("Final Answer", "About 200 kWh per person."),
+    ]),
+    ("What share of wind plus solar output came from wind in 2023, in percent?", [
+        ("Search", "global wind power output 2023"),
+        ("Search", "global solar power output 2023"),
+        ("Calculator", "2300 / (2300 + 1600) * 100"),
+        ("Final Answer", "About 59 percent."),
+    ]),
+]
+
+# Stand-in completion model: replays agent steps from a script and turns llm-math prompts into their expression,
+# sleeping like a network round trip on every call
+class StandInLLM(LLM):
+    script: list = []
+    latency: float = 0.2
+    position: int = 0
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "stand-in"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        self.calls += 1
+        if "numexpr" in prompt:
+            question = prompt.rsplit("Question:", 1)[-1].strip()
+            return f"```text\n{evaluate_expression(question)}\n```"
+        action, action_input = self.script[self.position]
+        self.position += 1
+        if action == "Final Answer":
+            return f"Thought: I now know the final answer\nFinal Answer: {action_input}"
+        return f"Thought: I should use {action}.\nAction: {action}\nAction Input: {action_input}"
+
+# Stand-in for SERPAPI with the same latency model
+def stand_in_search_tool(latency, counter):
+    def search(query):
+        time.sleep(latency)
+        counter["calls"] += 1
+        return LOCAL_SEARCH_RESULTS.get(" ".join(query.lower().split()), "No good search result found")
+    return Tool(name="Search", func=search,
+                description="A search engine. Useful for when you need to answer questions about current events.")
+
+# Run the scripted queries twice (a user asking again) with the original tools and with the local ones
+def benchmark(latency=0.2):
+    script = [step for _, steps in BENCHMARK_SCRIPT for step in steps]
+    queries = [query for query, _ in BENCHMARK_SCRIPT] * 2
+    for label, local_math in (("llm-math, uncached search", False), ("local math, cached search", True)):
+        llm = StandInLLM(script=script * 2, latency=latency)
+        search_counter = {"calls": 0}
+        cache = SearchCache(os.path.join(tempfile.mkdtemp(), "search_results.sqlite"))
+        tools = build_tools(llm, stand_in_search_tool(latency, search_counter), local_math, cache)
+        agent = initialize_agent(tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+                                 return_intermediate_steps=True)
+        steps = 0
+        start = time.perf_counter()
+        for query in queries:
+            steps += len(agent.invoke(query)["intermediate_steps"]) + 1
+        elapsed = time.perf_counter() - start
+        print(f"{label}: {len(queries)} queries, {steps} agent steps, {llm.calls} LLM calls, "
+              f"{search_counter['calls']} search calls, {elapsed:.2f}s ({elapsed / len(queries):.2f}s/query)")
+        cache.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a question with a search + math LangChain agent.")
+    parser.add_argument("--query", default="What was the total solar power output globally in 2023?")
+    parser.add_argument("--llm-math", action="store_true", help="Send every calculation through the LLM")
+    parser.add_argument("--search-cache", default=SEARCH_CACHE_PATH, help="SQLite file caching search results")
+    parser.add_argument("--benchmark", action="store_true", help="Compare tools on scripted queries with stand-ins")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per stand-in LLM or search call")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.latency)
+        raise SystemExit
+
+    # Initialize the OpenAI agent with a specific temperature setting
+    llm = OpenAI(temperature=.7)
 
-# Load necessary tools for the agent, including SERPAPI for searches and llm-math for mathematical queries
-tools = load_tools(["serpapi", "llm-math"], llm=llm)
+    # Load necessary tools for the agent: SERPAPI for searches and a calculator for mathematical queries
+    search_cache = None if args.llm_math else SearchCache(args.search_cache)
+    tools = build_tools(llm, local_math=not args.llm_math, search_cache=search_cache)
 
-# Initialize the agent with the loaded tools, setting it to a zero-shot react description mode for dynamic response handling
-agent = initialize_agent(
-    tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=True
-)
+    # Initialize the agent with the loaded tools, setting it to a zero-shot react description mode for dynamic response handling
+    agent = initialize_agent(
+        tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=True
+    )
 
-# Define a query and invoke the agent to handle it, demonstrating the agent's capability to generate and evaluate responses
-#query="How much energy did wind turbines produce worldwide in 2023?"
-query="What was the total solar power output globally in 2023?"
-agent.invoke(query)
+    # Define a query and invoke the agent to handle it, demonstrating the agent's capability to generate and evaluate responses
+    #query="How much energy did wind turbines produce worldwide in 2023?"
+    agent.invoke(args.query)
@@ -7,13 +7,15 @@
 #
 # About: This script demonstrates using LangChain to generate responses in French and evaluate them for inappropriate content. It uses LangChain's core components, including ChatPromptTemplate and ChatOpenAI, to construct and invoke a response-evaluation chain.
 # Setup: Requires Python with LangChain and LangChain-OpenAI installed. Ensure the API key is securely stored and masked in the actual implementation.
+# Responses are cached by Langchain_ResponseCache.py, so rerunning with the same input doesn't call the API again.
 import os
 from langchain_openai import ChatOpenAI
+from Langchain_ResponseCache import shared_cache
 
 os.environ["OPENAI_API_KEY"] = "INSERT_OPENAI_API_KEY_HERE"
 
-# Initialize the language model
-llm = ChatOpenAI(temperature=0)
+# Initialize the language model, answering repeated prompts from the shared response cache
+llm = ChatOpenAI(temperature=0, cache=shared_cache())
 
 # Define a prompt template
 from langchain_core.prompts import ChatPromptTemplate
@@ -30,3 +32,4 @@ chain = prompt | llm
 response = chain.invoke({"input": "Hello World!", "validate": "If the input's inappropriate, I'll ask, 'Do you kiss your mother with that mouth?'", "language": "French"})
 
 print(response)
+print(f"Response cache: {shared_cache().stats()}")
@@ -7,43 +7,585 @@
 # About: While the example provided focuses on consumer safety related to safe water standards, the script itself is designed to be versatile, capable of processing any text dataset to autonomously find, analyze, and summarize information on a wide range of topics as requested by the user, ensuring the response is accessible and in the specified language.
 # Setup: Python environment with LangChain-Community and ChromaDB installed is required. The OPENAI_API_KEY must be securely stored for the script to access OpenAI's services.
 # Note: The example demonstrates the process of chunking a large text dataset, embedding it for efficient retrieval, querying relevant information, and then summarizing the findings in a concise manner.
+# Index: Chunks are stored in a persistent Chroma collection under '../cache/rag_index', keyed by a hash of their
+# content, so a rerun only embeds chunks that are new or changed. '--embeddings hashing' swaps OpenAI embeddings
+# for a local feature-hashing backend, and '--retrieve-only' skips the LLM, so retrieval runs fully offline.
+# Vector store: '--vector-store numpy' loads the persisted embeddings into one contiguous float32 matrix and answers
+# many queries at once with a single matrix multiply; '--ivf-lists N' adds a cluster-pruned approximate mode.
+# '--benchmark-retrieval' compares recall@k and queries/sec of Chroma, exact NumPy and IVF search.
+# Keyword search: '--retriever bm25' answers from an in-process BM25 inverted index with no embedding call at all,
+# and '--retriever hybrid' fuses BM25 and vector results with reciprocal rank fusion. The BM25 index is saved next
+# to the vector index and reloaded on later runs while the chunks are unchanged.
+# Streaming: '--streaming' reads the file lazily and yields chunks of '--chunk-tokens' tokens (with overlap) that feed
+# the index in batches, so memory stays bounded for very large inputs. '--benchmark-splitter' compares its throughput
+# and peak memory with the in-memory CharacterTextSplitter.
+# Batch QA: '--questions-file questions.txt' retrieves for every question at once, packs each question's top-k chunks
+# (with overlapping text removed) into a '--token-budget' token prompt and calls the LLM with at most
+# '--max-concurrency' requests in flight, reporting tokens sent per question. '--fake-llm' uses a local stand-in model.
+# Cache: LLM responses are cached by Langchain_ResponseCache.py, so a repeated prompt doesn't call the API again.
 # Install necessary packages for running the script
-# pip install chromadb 
+# pip install chromadb
 # pip install -U langchain-community
 #
 from langchain_openai import ChatOpenAI
 from langchain_openai import OpenAIEmbeddings
+from langchain.retrievers import EnsembleRetriever
 from langchain.text_splitter import CharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.retrievers import BaseRetriever
 from langchain_community.vectorstores import Chroma
+from Langchain_ResponseCache import SlowFakeChatModel, shared_cache
+from collections import Counter
+from operator import itemgetter
+from typing import Any, List, Optional
+import argparse
+import hashlib
+import heapq
+import json
+import math
 import os
+import re
+import time
+import tracemalloc
+import numpy as np
+import tiktoken
+
+DATASET_PATH = "../datasets/EPA-consumer-safety-safe-water.txt"
+INDEX_DIRECTORY = "../cache/rag_index"
+QUESTION = "What is considered safe drinking water?"
+BENCHMARK_QUESTIONS = [
+    QUESTION,
+    "How is lead removed from drinking water?",
+    "Who sets the standards for public water systems?",
+    "What should I do if my water is contaminated with bacteria?",
+    "How often do water utilities have to test for contaminants?",
+    "What are the health effects of nitrate in drinking water?",
+    "How can I find out what is in my tap water?",
+    "Is bottled water safer than tap water?",
+]
 
 # Set the OpenAI API key in the environment securely
 os.environ["OPENAI_API_KEY"] = "INSERT_OPENAI_API_KEY_HERE"
 
-# Prepare the dataset by splitting it into manageable chunks for processing
-full_text = open("../datasets/EPA-consumer-safety-safe-water.txt", "r").read()
-text_splitter = CharacterTextSplitter(chunk_size=2048, chunk_overlap=100)
-texts = text_splitter.split_text(full_text)
+# Local embedding backend: a feature-hashed bag of words, so the index can be built and tested offline
+class HashingEmbeddings(Embeddings):
+    def __init__(self, dimensions=1024):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+        for token in re.findall(r"\w+", text.lower()):
+            # A stable hash picks the slot and the sign, so vectors match across runs and processes
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+# Embedding backends selectable with --embeddings
+EMBEDDING_BACKENDS = {
+    "openai": OpenAIEmbeddings,
+    "hashing": HashingEmbeddings,
+}
+
+# Identify a chunk by its content, so unchanged chunks keep their stored embedding
+def chunk_id(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# One collection per source file and embedding backend, since vectors from different backends don't mix
+def collection_name(source_path, backend):
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return re.sub(r"[^A-Za-z0-9_-]", "-", f"{stem}-{backend}")[:63].strip("-_")
+
+# Group an iterable into lists of at most batch_size items
+def batched(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Open the persisted index and bring it in line with the current chunks, embedding only what changed.
+# Chunks may come from a generator: they are consumed batch by batch and only their ids are kept.
+def build_index(texts, embeddings, name, persist_directory=INDEX_DIRECTORY, batch_size=1000):
+    start = time.perf_counter()
+    db = Chroma(collection_name=name, embedding_function=embeddings, persist_directory=persist_directory)
+
+    seen_ids = set()
+    embedded = reused = 0
+    for batch in batched(texts, batch_size):
+        chunks = {chunk_id(text): text for text in batch if chunk_id(text) not in seen_ids}
+        stored = set(db.get(ids=list(chunks), include=[])["ids"]) if chunks else set()
+        new_ids = [key for key in chunks if key not in stored]
+        if new_ids:
+            db.add_texts([chunks[key] for key in new_ids], ids=new_ids)
+        seen_ids.update(chunks)
+        embedded += len(new_ids)
+        reused += len(chunks) - len(new_ids)
+
+    stale_ids = list(set(db.get(include=[])["ids"]) - seen_ids)
+    if stale_ids:
+        db.delete(ids=stale_ids)
+
+    elapsed = time.perf_counter() - start
+    print(f"Index '{name}': embedded {embedded} new chunks, reused {reused}, "
+          f"removed {len(stale_ids)} stale in {elapsed:.2f}s")
+    return db
+
+# Read a file lazily in pieces of whole lines, roughly read_chars characters each
+def read_text_pieces(file_path, read_chars=1 << 16):
+    piece, size = [], 0
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            piece.append(line)
+            size += len(line)
+            if size >= read_chars:
+                yield "".join(piece)
+                piece, size = [], 0
+    if piece:
+        yield "".join(piece)
+
+# Yield chunks of chunk_tokens tokens, each sharing overlap_tokens with the previous one; only one piece
+# of the file and one chunk of tokens are held in memory at a time
+def stream_token_chunks(file_path, chunk_tokens=512, overlap_tokens=25, encoding_name="cl100k_base"):
+    if not 0 <= overlap_tokens < chunk_tokens:
+        raise ValueError("overlap_tokens must be at least 0 and smaller than chunk_tokens")
+    encoding = tiktoken.get_encoding(encoding_name)
+    step = chunk_tokens - overlap_tokens
+    buffer = []
+    pending = 0  # Tokens in the buffer not yet emitted in any chunk
+    for piece in read_text_pieces(file_path):
+        tokens = encoding.encode(piece)
+        buffer.extend(tokens)
+        pending += len(tokens)
+        while len(buffer) >= chunk_tokens:
+            yield encoding.decode(buffer[:chunk_tokens])
+            buffer = buffer[step:]
+            pending = len(buffer) - overlap_tokens
+    if pending > 0:
+        yield encoding.decode(buffer)
+
+# Compare throughput and peak memory of the in-memory and streaming splitters
+def benchmark_splitter(file_path, chunk_tokens=512, overlap_tokens=25):
+    size_mb = os.path.getsize(file_path) / 2**20
+    runs = {
+        "CharacterTextSplitter": lambda: CharacterTextSplitter(chunk_size=2048, chunk_overlap=100).split_text(
+            open(file_path, "r").read()),
+        "streaming token splitter": lambda: sum(1 for _ in stream_token_chunks(file_path, chunk_tokens, overlap_tokens)),
+    }
+    for name, run in runs.items():
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        chunks = result if isinstance(result, int) else len(result)
+        print(f"{name}: {chunks} chunks, {size_mb / elapsed:.2f} MB/sec, {chunks / elapsed:.0f} chunks/sec, "
+              f"peak memory {peak / 2**20:.1f} MB")
+
+# Row indices of the k highest scores in each row, best first
+def top_k_indices(scores, k):
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+# In-process vector store: every embedding lives in one contiguous float32 matrix of unit-length rows
+class NumpyVectorStore:
+    def __init__(self, texts, vectors, embeddings):
+        self.texts = list(texts)
+        self.embeddings = embeddings
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.matrix = self._normalize(vectors.reshape(len(self.texts), -1)) if self.texts else np.zeros((0, 0), np.float32)
+        self.ivf = None
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.ascontiguousarray(vectors / np.maximum(norms, 1e-12), dtype=np.float32)
+
+    # Build the store by embedding texts in batches
+    @classmethod
+    def from_texts(cls, texts, embeddings, batch_size=1000):
+        texts = list(texts)
+        vectors = []
+        for i in range(0, len(texts), batch_size):
+            vectors.extend(embeddings.embed_documents(texts[i:i + batch_size]))
+        return cls(texts, vectors, embeddings)
+
+    # Reuse the embeddings already persisted in a Chroma collection instead of recomputing them
+    @classmethod
+    def from_chroma(cls, db, embeddings):
+        stored = db.get(include=["documents", "embeddings"])
+        return cls(stored["documents"], stored["embeddings"], embeddings)
+
+    # Spherical k-means over the rows; each cluster's rows are stored contiguously in one permutation array
+    def build_ivf(self, n_lists=None, iterations=10, seed=0):
+        rows = len(self.matrix)
+        if rows == 0:
+            return self
+        n_lists = max(1, min(n_lists or int(math.sqrt(rows)), rows))
+        rng = np.random.default_rng(seed)
+        centroids = self.matrix[rng.choice(rows, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(self.matrix @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, self.matrix)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # An emptied cluster keeps its previous centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids).astype(np.float32)
+        assignment = np.argmax(self.matrix @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        self.ivf = (np.ascontiguousarray(centroids), order, offsets)
+        return self
+
+    # Exact top-k for a whole batch of query vectors with one matrix multiply
+    def search_vectors(self, query_vectors, k=4):
+        queries = self._normalize(np.asarray(query_vectors, dtype=np.float32))
+        return top_k_indices(queries @ self.matrix.T, k)
+
+    # Approximate top-k: only score the rows of the n_probe clusters closest to each query
+    def search_vectors_ivf(self, query_vectors, k=4, n_probe=4):
+        centroids, order, offsets = self.ivf
+        queries = self._normalize(np.asarray(query_vectors, dtype=np.float32))
+        probes = top_k_indices(queries @ centroids.T, n_probe)
+        results = []
+        for query, lists in zip(queries, probes):
+            candidates = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in lists])
+            best = top_k_indices((self.matrix[candidates] @ query)[np.newaxis, :], k)[0]
+            results.append(candidates[best])
+        return results
+
+    # Top-k documents for many questions at once; n_probe switches to the IVF index when it has been built
+    def similarity_search_batch(self, questions, k=4, n_probe=None):
+        if not self.texts:
+            return [[] for _ in questions]
+        query_vectors = self.embeddings.embed_documents(list(questions))
+        if n_probe and self.ivf is not None:
+            hits = self.search_vectors_ivf(query_vectors, k, n_probe)
+        else:
+            hits = self.search_vectors(query_vectors, k)
+        return [[Document(page_content=self.texts[i]) for i in row] for row in hits]
+
+    def as_retriever(self, k=4, n_probe=None):
+        return NumpyRetriever(store=self, k=k, n_probe=n_probe)
+
+# LangChain retriever over NumpyVectorStore; batch() answers every question with a single search
+class NumpyRetriever(BaseRetriever):
+    store: Any
+    k: int = 4
+    n_probe: Optional[int] = None
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        return self.store.similarity_search_batch([query], self.k, self.n_probe)[0]
+
+    def batch(self, inputs, config=None, **kwargs):
+        return self.store.similarity_search_batch(inputs, self.k, self.n_probe)
+
+# Compare Chroma, exact NumPy and IVF search: recall@k against exact search, and queries/sec
+def benchmark_retrieval(db, store, questions, k=4, n_probe=4):
+    exact = [[chunk_id(doc.page_content) for doc in docs] for docs in store.similarity_search_batch(questions, k)]
+
+    # Chroma answers one query at a time, the NumPy store the whole batch at once
+    chroma_retriever = db.as_retriever(search_kwargs={"k": k})
+    runs = {
+        "chroma": lambda: [chroma_retriever.invoke(question) for question in questions],
+        "numpy-exact": lambda: store.similarity_search_batch(questions, k),
+    }
+    if store.ivf is not None:
+        runs["numpy-ivf"] = lambda: store.similarity_search_batch(questions, k, n_probe)
+
+    for name, run in runs.items():
+        start = time.perf_counter()
+        results = run()
+        elapsed = time.perf_counter() - start
+        found = sum(len(set(chunk_id(doc.page_content) for doc in docs) & set(truth))
+                    for docs, truth in zip(results, exact))
+        recall = found / max(1, sum(len(truth) for truth in exact))
+        print(f"{name}: recall@{k} {recall:.3f}, {len(questions) / elapsed:.1f} queries/sec")
+
+# Lowercased word tokens used by the keyword index
+def keyword_tokens(text):
+    return re.findall(r"\w+", text.lower())
 
-# Initialize the embedding model and create a searchable database from the chunked texts
-embeddings = OpenAIEmbeddings()
-db = Chroma.from_texts(texts, embeddings)
-retriever = db.as_retriever()
+# BM25 inverted index: each posting already holds its term's full BM25 contribution, so a query only adds numbers up
+class BM25Index:
+    def __init__(self, texts, postings, fingerprint):
+        self.texts = texts
+        self.postings = postings  # term -> (document indices, BM25 weights)
+        self.fingerprint = fingerprint
 
-# Use the retriever to find documents relevant to the query about safe drinking water
-retrieved_docs = retriever.invoke("What is considered safe drinking water?")
+    # Fingerprint of the chunk list, used to tell whether a saved index still matches the corpus
+    @staticmethod
+    def corpus_fingerprint(texts):
+        digest = hashlib.sha256()
+        for text in texts:
+            digest.update(chunk_id(text).encode("ascii"))
+        return digest.hexdigest()
 
-# Configure the prompt template for concise summarization
-prompt = ChatPromptTemplate.from_messages([
-    ("system", "Please summarize the response in {language} in 30 words or less. {validate}"),
-    ("human", "{input}")
+    @classmethod
+    def from_texts(cls, texts, k1=1.5, b=0.75):
+        texts = list(texts)
+        term_counts = [Counter(keyword_tokens(text)) for text in texts]
+        lengths = [sum(counts.values()) for counts in term_counts]
+        average_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+        raw_postings = {}
+        for doc, counts in enumerate(term_counts):
+            for term, tf in counts.items():
+                raw_postings.setdefault(term, []).append((doc, tf))
+
+        postings = {}
+        for term, entries in raw_postings.items():
+            idf = math.log(1 + (len(texts) - len(entries) + 0.5) / (len(entries) + 0.5))
+            docs, weights = [], []
+            for doc, tf in entries:
+                norm = k1 * (1 - b + b * lengths[doc] / average_length)
+                docs.append(doc)
+                weights.append(idf * tf * (k1 + 1) / (tf + norm))
+            postings[term] = (docs, weights)
+        return cls(texts, postings, cls.corpus_fingerprint(texts))
+
+    # Top-k (document index, score) pairs for a query
+    def search(self, query, k=4):
+        scores = {}
+        for term in set(keyword_tokens(query)):
+            docs, weights = self.postings.get(term, ((), ()))
+            for doc, weight in zip(docs, weights):
+                scores[doc] = scores.get(doc, 0.0) + weight
+        return heapq.nlargest(k, scores.items(), key=itemgetter(1))
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": self.fingerprint, "texts": self.texts, "postings": self.postings}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["texts"], data["postings"], data["fingerprint"])
+
+    # Reuse the saved index when it was built from these exact chunks, otherwise rebuild and save it
+    @classmethod
+    def load_or_build(cls, texts, path):
+        start = time.perf_counter()
+        if os.path.exists(path):
+            index = cls.load(path)
+            if index.fingerprint == cls.corpus_fingerprint(texts):
+                print(f"BM25 index loaded from '{path}' in {(time.perf_counter() - start) * 1000:.1f} ms")
+                return index
+        index = cls.from_texts(texts)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        index.save(path)
+        print(f"BM25 index built over {len(texts)} chunks in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return index
+
+    def as_retriever(self, k=4):
+        return BM25IndexRetriever(index=self, k=k)
+
+# LangChain retriever over BM25Index
+class BM25IndexRetriever(BaseRetriever):
+    index: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        return [Document(page_content=self.index.texts[doc]) for doc, _ in self.index.search(query, self.k)]
+
+# Prompt used by batch QA: the packed context plus the question itself
+QA_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "Answer the question in {language} in 30 words or less using only the context. {validate}"),
+    ("human", "Context:\n{context}\n\nQuestion: {question}")
 ])
 
-# Set up the LangChain LLM for processing the information retrieved, defining the sequence for action
-llm = ChatOpenAI(temperature=0)
-chain = prompt | llm
+# Non-empty lines of a questions file
+def read_questions(file_path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+# Length of the longest suffix of left that is also a prefix of right (ignoring overlaps shorter than min_overlap)
+def overlap_length(left, right, min_overlap=20, max_overlap=1000):
+    for size in range(min(len(left), len(right), max_overlap), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+# Pack chunks, best first, into at most token_budget tokens, dropping text already included by an earlier chunk
+def pack_context(texts, encoding, token_budget, separator="\n\n"):
+    packed = []
+    used_tokens = 0
+    separator_tokens = len(encoding.encode(separator))
+    for text in texts:
+        if any(text in included for included in packed):
+            continue  # Duplicate, or wholly contained in a chunk already packed
+        # Neighbouring chunks share their overlap; keep only the part that is new
+        for included in packed:
+            text = text[overlap_length(included, text):]
+            cut = overlap_length(text, included)
+            text = text[:len(text) - cut]
+        if not text.strip():
+            continue
+        tokens = encoding.encode(text)
+        cost = len(tokens) + (separator_tokens if packed else 0)
+        if used_tokens + cost > token_budget:
+            if not packed:
+                # Even the best chunk is over budget, so send as much of it as fits
+                packed.append(encoding.decode(tokens[:token_budget]))
+            break
+        packed.append(text)
+        used_tokens += cost
+    return separator.join(packed)
+
+# Tokens the rendered prompt sends to the model
+def prompt_tokens(prompt_value, encoding):
+    return sum(len(encoding.encode(message.content)) for message in prompt_value.to_messages())
+
+# The real chat model, or a local stand-in that needs no API key or network; both answer repeats from the shared cache
+def build_llm(fake=False):
+    if fake:
+        return SlowFakeChatModel(responses=["(fake answer)"], latency=0.0, cache=shared_cache())
+    return ChatOpenAI(temperature=0, cache=shared_cache())
+
+# Answer many questions: one batched retrieval, packed contexts, and LLM calls with bounded concurrency
+def answer_questions(questions, retriever, llm, language="Spanish", validate="Ensure clarity and accessibility",
+                     token_budget=1500, max_concurrency=4, encoding_name="cl100k_base"):
+    encoding = tiktoken.get_encoding(encoding_name)
+
+    start = time.perf_counter()
+    documents = retriever.batch(questions)
+    print(f"Retrieved context for {len(questions)} questions in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    inputs = []
+    for question, docs in zip(questions, documents):
+        context = pack_context([doc.page_content for doc in docs], encoding, token_budget)
+        inputs.append({"context": context, "question": question, "language": language, "validate": validate})
+    sent_tokens = [prompt_tokens(QA_PROMPT.invoke(values), encoding) for values in inputs]
+
+    start = time.perf_counter()
+    responses = (QA_PROMPT | llm).batch(inputs, config={"max_concurrency": max_concurrency})
+    elapsed = time.perf_counter() - start
+
+    for question, tokens, response in zip(questions, sent_tokens, responses):
+        print(f"[{tokens} tokens] {question}\n  {response.content}")
+    print(f"Answered {len(questions)} questions in {elapsed:.2f}s with max_concurrency={max_concurrency}; "
+          f"{sum(sent_tokens)} prompt tokens sent ({sum(sent_tokens) / max(1, len(questions)):.0f} per question)")
+    return responses, sent_tokens
+
+# Retrieve documents for a question and report how long the lookup took
+def timed_retrieve(retriever, question):
+    start = time.perf_counter()
+    documents = retriever.invoke(question)
+    print(f"Query latency: {(time.perf_counter() - start) * 1000:.1f} ms for {question!r}")
+    return documents
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a question about a text file with RAG.")
+    parser.add_argument("--input", default=DATASET_PATH, help="Text file to index")
+    parser.add_argument("--question", default=QUESTION, help="Question to answer")
+    parser.add_argument("--embeddings", choices=sorted(EMBEDDING_BACKENDS), default="openai",
+                        help="Embedding backend used to build and query the index")
+    parser.add_argument("--index-directory", default=INDEX_DIRECTORY, help="Where the persistent index lives")
+    parser.add_argument("--retrieve-only", action="store_true", help="Print the retrieved chunk instead of calling the LLM")
+    parser.add_argument("--vector-store", choices=["chroma", "numpy"], default="chroma",
+                        help="Search the Chroma collection or an in-process NumPy matrix built from it")
+    parser.add_argument("--ivf-lists", type=int, help="Build an IVF index with this many clusters for approximate search")
+    parser.add_argument("--n-probe", type=int, default=4, help="Clusters searched per query in IVF mode")
+    parser.add_argument("--top-k", type=int, default=4, help="Documents retrieved per question")
+    parser.add_argument("--benchmark-retrieval", action="store_true",
+                        help="Compare recall@k and queries/sec of Chroma, NumPy and IVF search, then exit")
+    parser.add_argument("--retriever", choices=["vector", "bm25", "hybrid"], default="vector",
+                        help="Vector search, BM25 keyword search, or both fused with reciprocal rank fusion")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Read the file lazily and split it into token-sized chunks")
+    parser.add_argument("--chunk-tokens", type=int, default=512, help="Tokens per chunk in --streaming mode")
+    parser.add_argument("--overlap-tokens", type=int, default=25, help="Tokens shared by consecutive chunks")
+    parser.add_argument("--benchmark-splitter", action="store_true",
+                        help="Compare the in-memory and streaming splitters, then exit")
+    parser.add_argument("--questions-file", help="Answer every question in this file (one per line), then exit")
+    parser.add_argument("--token-budget", type=int, default=1500, help="Maximum context tokens packed per question")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="Maximum LLM calls in flight in batch mode")
+    parser.add_argument("--language", default="Spanish", help="Language to answer in")
+    parser.add_argument("--fake-llm", action="store_true", help="Use a local stand-in chat model instead of OpenAI")
+    args = parser.parse_args()
+
+    if args.benchmark_splitter:
+        benchmark_splitter(args.input, args.chunk_tokens, args.overlap_tokens)
+        raise SystemExit
+
+    # Prepare the dataset by splitting it into manageable chunks for processing
+    if args.streaming:
+        # A generator; it is only materialized when the BM25 index needs every chunk at once
+        texts = stream_token_chunks(args.input, args.chunk_tokens, args.overlap_tokens)
+        if args.retriever != "vector":
+            texts = list(texts)
+    else:
+        full_text = open(args.input, "r").read()
+        text_splitter = CharacterTextSplitter(chunk_size=2048, chunk_overlap=100)
+        texts = text_splitter.split_text(full_text)
+
+    # The keyword index needs no embeddings, so the BM25-only path never calls an embedding API
+    if args.retriever in ("bm25", "hybrid"):
+        bm25_path = os.path.join(args.index_directory, collection_name(args.input, "bm25") + ".json")
+        keyword_retriever = BM25Index.load_or_build(texts, bm25_path).as_retriever(args.top_k)
+
+    if args.retriever == "bm25":
+        retriever = keyword_retriever
+    else:
+        # Initialize the embedding model and update the persisted, searchable database from the chunked texts
+        embeddings = EMBEDDING_BACKENDS[args.embeddings]()
+        db = build_index(texts, embeddings, collection_name(args.input, args.embeddings), args.index_directory)
+        retriever = db.as_retriever(search_kwargs={"k": args.top_k})
+
+        if args.vector_store == "numpy" or args.benchmark_retrieval:
+            store = NumpyVectorStore.from_chroma(db, embeddings)
+            if args.ivf_lists or args.benchmark_retrieval:
+                store.build_ivf(args.ivf_lists)
+            if args.benchmark_retrieval:
+                benchmark_retrieval(db, store, BENCHMARK_QUESTIONS, args.top_k, args.n_probe)
+                raise SystemExit
+            retriever = store.as_retriever(args.top_k, args.n_probe if args.ivf_lists else None)
+
+        if args.retriever == "hybrid":
+            # Reciprocal rank fusion of keyword and vector rankings, weighted equally
+            retriever = EnsembleRetriever(retrievers=[keyword_retriever, retriever], weights=[0.5, 0.5])
+
+    if args.questions_file:
+        answer_questions(read_questions(args.questions_file), retriever, build_llm(args.fake_llm), args.language,
+                         token_budget=args.token_budget, max_concurrency=args.max_concurrency)
+        print(f"Response cache: {shared_cache().stats()}")
+        raise SystemExit
+
+    # Use the retriever to find documents relevant to the query about safe drinking water
+    retrieved_docs = timed_retrieve(retriever, args.question)
+    if args.retrieve_only:
+        print(retrieved_docs[0].page_content)
+        raise SystemExit
+
+    # Configure the prompt template for concise summarization
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "Please summarize the response in {language} in 30 words or less. {validate}"),
+        ("human", "{input}")
+    ])
+
+    # Set up the LangChain LLM for processing the information retrieved, defining the sequence for action
+    llm = build_llm(args.fake_llm)
+    chain = prompt | llm
 
-# Execute the chain on the first retrieved document, specifying the output language and summary style
-response = chain.invoke({"input": retrieved_docs[0].page_content, "language": "Spanish", "validate": "Ensure clarity and accessibility"})
-print(response)
+    # Execute the chain on the first retrieved document, specifying the output language and summary style
+    response = chain.invoke({"input": retrieved_docs[0].page_content, "language": args.language, "validate": "Ensure clarity and accessibility"})
+    print(response)
+    print(f"Response cache: {shared_cache().stats()}")
@@ -0,0 +1,313 @@
+# Source: "Think Artificial Intelligence" by Jerry Cuomo, 2024
+# Purpose: Educational code examples from the book.
+# Copyright © 2024 Jerry Cuomo. All rights reserved.
+#
+# About: A shared response cache for the LangChain scripts (Langchain_Prompt_HelloWorld.py, Langchain_RAG_WaterSafety_QA.py
+# and Will.i.am_Robo_Interview_Generator.py). It plugs into any LangChain chat model through its 'cache' argument, so an
+# identical request - same model, same temperature and other settings, same fully rendered messages - is answered
+# from the cache instead of paying another round trip. Lookups go to an in-memory LRU tier first and then to an SQLite
+# tier whose entries expire after a TTL and whose size is bounded by evicting the least recently used rows.
+#
+# Usage: 'llm = ChatOpenAI(temperature=0, cache=shared_cache())', then 'print(shared_cache().stats())'.
+# Running this file directly exercises both tiers against a local stand-in chat model, with no API key needed;
+# '--check' asserts memory and disk hits, TTL expiry, LRU eviction and the hit/miss counters.
+#
+# Setup: Requires Python with langchain_core installed ('pip install langchain_core').
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import warnings
+from collections import OrderedDict
+
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.caches import BaseCache
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult, Generation, GenerationChunk
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+
+CACHE_PATH = "../cache/llm_responses.sqlite"
+
+# Only these classes may be revived from the SQLite tier
+ALLOWED_OBJECTS = [Generation, GenerationChunk, ChatGeneration, ChatGenerationChunk, AIMessage, AIMessageChunk]
+
+# Revive one stored generation; 'loads' is marked beta, which is expected here
+def load_generation(serialized):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", LangChainBetaWarning)
+        return loads(serialized, allowed_objects=ALLOWED_OBJECTS)
+
+# Two-tier LangChain cache: an in-memory LRU in front of an SQLite table with TTL and a row limit
+class TieredLLMCache(BaseCache):
+    def __init__(self, path=CACHE_PATH, memory_entries=256, max_entries=10000, ttl_seconds=7 * 24 * 3600):
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory = OrderedDict()  # key -> (created_at, generations), least recently used first
+        self.touched = {}  # key -> time of memory hits not yet written to SQLite's last_used
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # Chains may call the model from several threads, so one connection is shared behind a lock
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, created_at REAL NOT NULL, last_used REAL NOT NULL, generations TEXT NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.rows = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    # LangChain's llm_string already encodes the model name, temperature and other settings;
+    # the prompt is the serialized list of rendered messages
+    @staticmethod
+    def _key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at >= self.ttl_seconds
+
+    def _remember(self, key, created_at, generations):
+        self.memory[key] = (created_at, generations)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def lookup(self, prompt, llm_string):
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and not self._expired(entry[0], now):
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                # Memory hits keep the disk tier's LRU order honest; the timestamps are written in batches
+                self.touched[key] = now
+                if len(self.touched) >= self.memory_entries:
+                    self._write_touches()
+                return entry[1]
+            self.memory.pop(key, None)
+
+            row = self.connection.execute(
+                "SELECT created_at, generations FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and not self._expired(row[0], now):
+                generations = [load_generation(generation) for generation in json.loads(row[1])]
+                self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                self.connection.commit()
+                self._remember(key, row[0], generations)
+                self.disk_hits += 1
+                return generations
+            if row is not None:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.connection.commit()
+                self.rows -= 1
+            self.misses += 1
+            return None
+
+    def update(self, prompt, llm_string, return_val):
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        serialized = json.dumps([dumps(generation) for generation in return_val])
+        with self.lock:
+            self._remember(key, now, return_val)
+            exists = self.connection.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, created_at, last_used, generations) VALUES (?, ?, ?, ?)",
+                (key, now, now, serialized),
+            )
+            if exists is None:
+                self.rows += 1
+            self._evict(now)
+            self.connection.commit()
+
+    def _write_touches(self):
+        if self.touched:
+            self.connection.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                                        [(used, key) for key, used in self.touched.items()])
+            self.connection.commit()
+            self.touched.clear()
+
+    # Drop expired rows, then the least recently used ones until the table is back under max_entries
+    def _evict(self, now):
+        if self.rows <= self.max_entries:
+            return
+        self._write_touches()
+        if self.ttl_seconds is not None:
+            self.connection.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl_seconds,))
+        self.rows = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = self.rows - self.max_entries
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self.rows -= excess
+
+    def clear(self, **kwargs):
+        with self.lock:
+            self.memory.clear()
+            self.touched.clear()
+            self.connection.execute("DELETE FROM responses")
+            self.connection.commit()
+            self.rows = 0
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self.lock:
+            self._write_touches()
+            self.connection.close()
+
+_shared_cache = None
+
+# One cache per process, shared by every chain that asks for it
+def shared_cache(path=CACHE_PATH):
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = TieredLLMCache(path)
+    return _shared_cache
+
+# Local stand-in chat model with artificial latency, used to show the cache and concurrency without an API key
+class SlowFakeChatModel(FakeListChatModel):
+    latency: float = 0.2
+
+    def _call(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super()._call(*args, **kwargs)
+
+    # Async calls wait without holding a thread, like a real network round trip
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        content = super()._call(messages, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    # FakeListChatModel runs batches one call at a time; use the regular concurrent Runnable batching instead
+    def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        return Runnable.batch(self, inputs, config, return_exceptions=return_exceptions, **kwargs)
+
+    async def abatch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        return await Runnable.abatch(self, inputs, config, return_exceptions=return_exceptions, **kwargs)
+
+# Run the same prompts through a stand-in model: cold, from the memory tier, and from SQLite after a restart
+def demo(latency=0.2):
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "Please respond in {language} in 20 words or less."),
+        ("human", "{input}")
+    ])
+    inputs = [{"input": text, "language": "French"} for text in ("Hello World!", "Good morning!", "Hello World!")]
+    path = os.path.join(tempfile.mkdtemp(), "llm_responses.sqlite")
+
+    def run(label, cache):
+        llm = SlowFakeChatModel(responses=["Bonjour le monde !"], latency=latency, cache=cache)
+        start = time.perf_counter()
+        for values in inputs:
+            (prompt | llm).invoke(values)
+        print(f"{label}: {time.perf_counter() - start:.2f}s, {cache.stats()}")
+
+    cache = TieredLLMCache(path)
+    run("cold cache", cache)
+    run("warm memory tier", cache)
+    cache.close()
+    run("restarted, SQLite tier", TieredLLMCache(path))
+
+# Assert the cache's behaviour against the stand-in model and direct lookups; raises AssertionError on a failure
+def check():
+    directory = tempfile.mkdtemp()
+    prompt = ChatPromptTemplate.from_messages([("human", "{input}")])
+
+    # Memory tier: the second identical call is answered without reaching the model
+    path = os.path.join(directory, "tiers.sqlite")
+    cache = TieredLLMCache(path)
+    llm = SlowFakeChatModel(responses=["first", "second"], latency=0.0, cache=cache)
+    assert (prompt | llm).invoke({"input": "Hello"}).content == "first"
+    assert (prompt | llm).invoke({"input": "Hello"}).content == "first"
+    assert llm.i == 1, "the model should have been called once"
+    assert cache.stats() == {"memory_hits": 1, "disk_hits": 0, "misses": 1, "hit_rate": 0.5}, cache.stats()
+    cache.close()
+
+    # Disk tier: a new cache on the same file (a restart) answers from SQLite, then from memory
+    cache = TieredLLMCache(path)
+    llm = SlowFakeChatModel(responses=["first", "second"], latency=0.0, cache=cache)
+    assert (prompt | llm).invoke({"input": "Hello"}).content == "first"
+    assert (prompt | llm).invoke({"input": "Hello"}).content == "first"
+    assert llm.i == 0, "the model should not have been called"
+    assert cache.stats() == {"memory_hits": 1, "disk_hits": 1, "misses": 0, "hit_rate": 1.0}, cache.stats()
+    cache.close()
+
+    generations = [ChatGeneration(message=AIMessage(content="answer"))]
+
+    # TTL: an expired entry is a miss in both tiers and is removed from SQLite
+    cache = TieredLLMCache(os.path.join(directory, "ttl.sqlite"), ttl_seconds=0.05)
+    cache.update("prompt", "llm", generations)
+    assert cache.lookup("prompt", "llm")[0].message.content == "answer"
+    time.sleep(0.1)
+    assert cache.lookup("prompt", "llm") is None
+    assert cache.rows == 0
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["misses"] == 1, cache.stats()
+    cache.close()
+
+    # LRU eviction: with room for two rows, adding a third drops the least recently used one
+    cache = TieredLLMCache(os.path.join(directory, "lru.sqlite"), memory_entries=1, max_entries=2)
+    cache.update("a", "llm", generations)
+    time.sleep(0.01)
+    cache.update("b", "llm", generations)
+    time.sleep(0.01)
+    assert cache.lookup("a", "llm") is not None  # Disk hit; 'a' is now more recent than 'b'
+    time.sleep(0.01)
+    cache.update("c", "llm", generations)
+    assert cache.rows == 2
+    assert cache.lookup("b", "llm") is None
+    assert cache.lookup("a", "llm") is not None
+    assert cache.lookup("c", "llm") is not None
+    assert cache.stats() == {"memory_hits": 0, "disk_hits": 3, "misses": 1, "hit_rate": 0.75}, cache.stats()
+    cache.close()
+
+    # LRU eviction counts memory-tier hits too: 'a' is only ever read from memory, yet 'b' is evicted
+    path = os.path.join(directory, "lru-memory.sqlite")
+    cache = TieredLLMCache(path, memory_entries=10, max_entries=2)
+    cache.update("a", "llm", generations)
+    time.sleep(0.01)
+    cache.update("b", "llm", generations)
+    time.sleep(0.01)
+    for _ in range(5):
+        assert cache.lookup("a", "llm") is not None
+    assert cache.stats()["memory_hits"] == 5, cache.stats()
+    time.sleep(0.01)
+    cache.update("c", "llm", generations)
+    cache.close()
+    cache = TieredLLMCache(path)
+    assert cache.lookup("a", "llm") is not None
+    assert cache.lookup("b", "llm") is None
+    assert cache.lookup("c", "llm") is not None
+    cache.close()
+    print("All cache checks passed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Demonstrate the tiered LLM response cache with a stand-in model.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds the stand-in model takes per call")
+    parser.add_argument("--check", action="store_true", help="Assert the cache's behaviour and exit")
+    args = parser.parse_args()
+    if args.check:
+        check()
+    else:
+        demo(args.latency)
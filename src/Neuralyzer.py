@@ -8,27 +8,50 @@
 # About: This script showcases an advanced technique for customizing AI model responses by applying logit bias adjustments. It employs OpenAI's API to dynamically alter the inclination of the model's answers, effectively demonstrating how to guide the AI away from unwanted topics or terms. The script includes examples of encoding terms for biasing, making biased API calls, and comparing responses with and without the applied biases.
 #
 # Setup: Python environment with `openai` and `tiktoken` libraries installed. Ensure the OpenAI API key is set in the environment variables for secure authentication.
+#
+# Usage: 'python Neuralyzer.py' runs the single prompt below with and without bias. '--grid' runs every prompt in
+# GRID_PROMPTS against every list in GRID_FORGET_LISTS concurrently over one pooled client and streams the results to
+# JSONL. Bias maps are compiled once per forget list, with memoized encodings, duplicate token ids removed and at most
+# LOGIT_BIAS_LIMIT entries. '--stand-in' points the client at a local HTTP stand-in for the chat completions endpoint.
 
-import openai
-import tiktoken
+import argparse
+import asyncio
+import functools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 import tiktoken
 import os
 
 # Set the OpenAI API key in the environment securely
 os.environ["OPENAI_API_KEY"] = "INSERT_YOUR_OPENAI_API_KEY_HERE"
 
-# Initialize the OpenAI client (API key should be set in your environment variables)
-client = OpenAI()
-
 # Model specification
 MODEL = "gpt-4"
 
+# The chat completions API accepts at most this many logit_bias entries per request
+LOGIT_BIAS_LIMIT = 300
+
 # Initialize the tokenizer for the given model
 # Used to convert text strings to numerical tokens compatible with the GPT-3 model
 ENCODER = tiktoken.encoding_for_model(MODEL)
 
+# Prompts and forget-lists run by --grid
+GRID_PROMPTS = [
+    "What animal jumped over the moon? Only provide name of animal.",
+    "List ingredients that go into cookies. List only if there's a match",
+    "who is Jerry Cuomo. Comment only if there's a match.",
+]
+GRID_FORGET_LISTS = [
+    [],
+    ["cow", "COW"],
+    ["butter", "buter", "lard", "butter", "palm oil", "coconut oil", "egg", "eggs", "yolks", "bacon", "sausages", "cheese", "milk", "cream", "beef", "pork", "lamb"],
+    ["Jerry", "Cuomo"],
+]
+
 # Utility function to expand given terms for biasing
 def expanded_terms(terms):
     return [
@@ -36,21 +59,40 @@ def expanded_terms(terms):
         for variant in [term, f" {term}", f"{term} ", term.capitalize(), f" {term.capitalize()}", f"{term.capitalize()} "]
     ]
 
-# Utility function to make biased API calls
-def biasedPrompt(prompt, terms_to_forget=[]):
-    # Expand the terms that need to be biased
-    expanded_terms_to_forget = expanded_terms(terms_to_forget)
-    #print("Expanded terms to forget:", expanded_terms_to_forget)
-    
-    # Encode the expanded terms to their token IDs
-    encoded_tokens = [token for trait in expanded_terms_to_forget for token in ENCODER.encode(trait)]
-    
-    # Generate logit bias adjustments based on the encoded tokens
-    logit_bias_adjustments = {str(token_id): -100 for token_id in encoded_tokens}
-    print("Logit bias adjustments:", logit_bias_adjustments)
-    
-    # Perform the API call with or without logit bias based on the terms_to_forget
-    response = client.chat.completions.create(
+# Encode a term variant once; the same variants recur across prompts and forget-lists
+@functools.lru_cache(maxsize=None)
+def encode_variant(variant):
+    return tuple(ENCODER.encode(variant))
+
+# Compile a forget-list into a logit_bias map: token ids are deduplicated and terms are added whole, in order. A term
+# whose new ids don't all fit under `limit` is skipped entirely (never half biased) and reported with a warning,
+# or a ValueError is raised when overflow="error". Each caller gets its own dict, so changing it can't affect others
+def compile_logit_bias(terms, bias=-100, limit=LOGIT_BIAS_LIMIT, overflow="truncate"):
+    return dict(_compiled_logit_bias(tuple(terms), bias, limit, overflow))
+
+# Memoized compilation, kept as an immutable tuple of (token id, bias) pairs
+@functools.lru_cache(maxsize=256)
+def _compiled_logit_bias(terms, bias, limit, overflow):
+    token_ids = {}
+    dropped_terms = []
+    for term in dict.fromkeys(terms):
+        new_ids = dict.fromkeys(token_id for variant in dict.fromkeys(expanded_terms([term]))
+                                for token_id in encode_variant(variant) if token_id not in token_ids)
+        if len(token_ids) + len(new_ids) > limit:
+            dropped_terms.append(term)
+            continue
+        token_ids.update(dict.fromkeys(new_ids, bias))
+    if dropped_terms:
+        message = f"logit_bias is capped at {limit} entries; tokens of {dropped_terms} were not biased"
+        if overflow == "error":
+            raise ValueError(message)
+        print(f"Warning: {message}")
+    return tuple((str(token_id), value) for token_id, value in token_ids.items())
+
+# Request body shared by the blocking and async clients
+def build_request(prompt, terms_to_forget=()):
+    logit_bias_adjustments = compile_logit_bias(terms_to_forget) if terms_to_forget else {}
+    return dict(
         model=MODEL,
         messages=[
             {"role": "system", "content": "Answer briefly and only if you know the answer."},
@@ -62,27 +104,147 @@ def biasedPrompt(prompt, terms_to_forget=[]):
         max_tokens=150,
         frequency_penalty=0,
         presence_penalty=-0.5,
-        logit_bias=logit_bias_adjustments if terms_to_forget else {}
+        logit_bias=logit_bias_adjustments
     )
 
+_clients = {}
+
+# Shared OpenAI client per base URL, created on first use (API key should be set in your environment variables)
+def get_client(base_url=None):
+    if base_url not in _clients:
+        _clients[base_url] = OpenAI(base_url=base_url)
+    return _clients[base_url]
+
+# Utility function to make biased API calls
+def biasedPrompt(prompt, terms_to_forget=[], client=None):
+    # Compile (or reuse) the logit bias adjustments for the terms that need to be biased
+    request = build_request(prompt, terms_to_forget)
+    print("Logit bias adjustments:", request["logit_bias"])
+
+    # Perform the API call with or without logit bias based on the terms_to_forget
+    response = (client or get_client()).chat.completions.create(**request)
+
     # Return the text result from the API call
     return response.choices[0].message.content
 
-# Define the prompt and terms that should be forgotten (biased)
-prompt = "What animal jumped over the moon? Only provide name of animal."
-terms_to_forget = ["cow", "COW"]
-# prompt = "List ingredients that go into cookies. List only if there's a match"
-# terms_to_forget = ["butter", "buter", "lard", "butter", "palm oil", "coconut oil", "egg", "eggs", "yolks", "bacon", "sausages", "cheese", "milk", "cream", "beef", "pork", "lamb"]
-#prompt = "who is Jerry Cuomo. Comment only if there's a match."
-#terms_to_forget = ["Jerry", "Cuomo"]
-
-# Make API calls and display results
-# First without any bias
-response_before = biasedPrompt(prompt)
-print(f"Before bias alteration: {prompt}")
-print(response_before)
-
-# Then with bias
-response_after = biasedPrompt(prompt, terms_to_forget)
-print(f"\nAfter bias alteration: {prompt}")
-print(response_after)
\ No newline at end of file
+# Run every prompt against every forget-list concurrently over one pooled async client,
+# writing each result to JSONL as soon as it arrives. A failed request is recorded in its row and the rest carry on
+async def run_grid(async_client, prompts, forget_lists, output_path, max_concurrency=8):
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(prompt_index, forget_index):
+        row = {
+            "prompt_index": prompt_index,
+            "forget_index": forget_index,
+            "prompt": prompts[prompt_index],
+            "terms_to_forget": forget_lists[forget_index],
+            "biased_tokens": None,
+            "response": None,
+            "error": None,
+            "latency_seconds": None,
+        }
+        start = time.perf_counter()
+        try:
+            request = build_request(prompts[prompt_index], forget_lists[forget_index])
+            row["biased_tokens"] = len(request["logit_bias"])
+            async with semaphore:
+                start = time.perf_counter()
+                response = await async_client.chat.completions.create(**request)
+            row["response"] = response.choices[0].message.content
+        except Exception as error:
+            row["error"] = f"{type(error).__name__}: {error}"
+        row["latency_seconds"] = round(time.perf_counter() - start, 4)
+        return row
+
+    tasks = [run_one(p, f) for p in range(len(prompts)) for f in range(len(forget_lists))]
+    start = time.perf_counter()
+    failures = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        for finished in asyncio.as_completed(tasks):
+            row = await finished
+            failures += row["error"] is not None
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+    print(f"Ran {len(tasks)} grid requests ({failures} failed) in {time.perf_counter() - start:.2f}s "
+          f"(max_concurrency={max_concurrency}), results in '{output_path}'")
+
+# Local stand-in for the chat completions endpoint, so the grid can run without an API key or network
+class StandInHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        time.sleep(self.latency)
+        body = json.dumps({
+            "id": "chatcmpl-stand-in",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", MODEL),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant",
+                            "content": f"stand-in reply ({len(request.get('logit_bias') or {})} biased tokens)"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+# Serve the stand-in on a free local port in a background thread; returns the server and its base URL
+def start_stand_in_server(latency=0.0):
+    handler = type("StandIn", (StandInHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bias a model's answers away from given terms.")
+    parser.add_argument("--grid", action="store_true", help="Run GRID_PROMPTS x GRID_FORGET_LISTS concurrently")
+    parser.add_argument("--output", default="../results/neuralyzer_grid.jsonl", help="Where --grid writes its JSONL")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Maximum requests in flight in --grid mode")
+    parser.add_argument("--base-url", help="Chat completions API base URL (defaults to OpenAI)")
+    parser.add_argument("--stand-in", action="store_true", help="Serve and use a local stand-in endpoint")
+    parser.add_argument("--stand-in-latency", type=float, default=0.2, help="Seconds the stand-in takes per request")
+    args = parser.parse_args()
+
+    base_url = args.base_url
+    if args.stand_in:
+        stand_in_server, base_url = start_stand_in_server(args.stand_in_latency)
+
+    if args.grid:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        asyncio.run(run_grid(AsyncOpenAI(base_url=base_url), GRID_PROMPTS, GRID_FORGET_LISTS,
+                             args.output, args.max_concurrency))
+        raise SystemExit
+
+    # Initialize the OpenAI client (API key should be set in your environment variables)
+    client = get_client(base_url)
+
+    # Define the prompt and terms that should be forgotten (biased)
+    prompt = "What animal jumped over the moon? Only provide name of animal."
+    terms_to_forget = ["cow", "COW"]
+    # prompt = "List ingredients that go into cookies. List only if there's a match"
+    # terms_to_forget = ["butter", "buter", "lard", "butter", "palm oil", "coconut oil", "egg", "eggs", "yolks", "bacon", "sausages", "cheese", "milk", "cream", "beef", "pork", "lamb"]
+    #prompt = "who is Jerry Cuomo. Comment only if there's a match."
+    #terms_to_forget = ["Jerry", "Cuomo"]
+
+    # Make API calls and display results
+    # First without any bias
+    response_before = biasedPrompt(prompt, client=client)
+    print(f"Before bias alteration: {prompt}")
+    print(response_before)
+
+    # Then with bias
+    response_after = biasedPrompt(prompt, terms_to_forget, client=client)
+    print(f"\nAfter bias alteration: {prompt}")
+    print(response_after)
@@ -9,12 +9,27 @@
 #
 # Setup: Python installed, with Gymnasium installed in your environment. 
 # Install Gymnasium using 'pip install gymnasium'. Ensure you have a suitable environment for rendering if you wish to visualize the simulation.
+#
+# Usage: 'python SimpleRLDemoAnnimateRL.py' plays 10 rendered episodes. '--headless --num-envs 16 --mode async' runs 16
+# environments without rendering through Gymnasium's vector env API, sampling one batch of actions per step and
+# keeping episode returns per environment. '--benchmark' compares environment steps/sec of the single-env loop with the
+# synchronous and asynchronous vector envs. Every transition of a headless run is kept in a RolloutBuffer; with
+# '--flush-directory ../results/rollouts' the buffer is appended to np.memmap files each time it fills, and
+# '--analyze ../results/rollouts' reopens those files and computes per-episode statistics a chunk of steps at a time.
+
+import argparse
+import json
+import os
+import time
 
 import gymnasium as gym
+import numpy as np
+
+ENV_ID = "LunarLander-v2"
 
 def main():
     # Initialize the Lunar Lander environment with render_mode specified
-    env = gym.make("LunarLander-v2", render_mode="human")
+    env = gym.make(ENV_ID, render_mode="human")
     
     # Reset the environment at the start of each episode
     observation, info = env.reset(seed=42)
@@ -51,5 +66,240 @@ def main():
     average_reward = sum(episode_rewards) / len(episode_rewards)
     print(f"Average reward over {len(episode_rewards)} episodes: {average_reward}")
 
+# The loop above without rendering, bounded by environment steps instead of episodes
+def run_single_env(env_id=ENV_ID, total_steps=10000, seed=42):
+    env = gym.make(env_id)
+    observation, info = env.reset(seed=seed)
+    episode_rewards = []
+    total_reward = 0.0
+    start = time.perf_counter()
+    for _ in range(total_steps):
+        observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+        total_reward += reward
+        if terminated or truncated:
+            episode_rewards.append(total_reward)
+            total_reward = 0.0
+            observation, info = env.reset()
+    elapsed = time.perf_counter() - start
+    env.close()
+    return total_steps, elapsed, episode_rewards
+
+# Fixed-size ring buffer of transitions for a vector env. All arrays are allocated up front with shape
+# (capacity, num_envs, ...) and each step is copied into the next slot, so adding a step allocates nothing.
+# flush() appends the steps added since the last flush to raw files that open_flushed() maps back with np.memmap
+class RolloutBuffer:
+    FIELDS = ("observations", "actions", "rewards", "terminated", "truncated")
+
+    def __init__(self, capacity, num_envs, observation_space, action_space):
+        self.capacity = capacity
+        self.num_envs = num_envs
+        self.arrays = {
+            "observations": np.zeros((capacity, num_envs, *observation_space.shape), observation_space.dtype),
+            "actions": np.zeros((capacity, num_envs, *action_space.shape), action_space.dtype),
+            "rewards": np.zeros((capacity, num_envs), np.float64),
+            "terminated": np.zeros((capacity, num_envs), np.bool_),
+            "truncated": np.zeros((capacity, num_envs), np.bool_),
+        }
+        self.position = 0      # Next slot to write
+        self.size = 0          # Valid steps held, up to capacity
+        self.wrapped = False   # True once the oldest steps have been overwritten
+        self.unflushed = 0     # Steps added since the last flush
+        self.flushed_steps = 0
+
+    # Store one vector step: the observations the actions were chosen from, and what the step returned
+    def add(self, observations, actions, rewards, terminated, truncated):
+        slot = self.position
+        for name, values in zip(self.FIELDS, (observations, actions, rewards, terminated, truncated)):
+            self.arrays[name][slot] = values
+        self.position = (slot + 1) % self.capacity
+        self.wrapped = self.wrapped or self.size == self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.unflushed = min(self.unflushed + 1, self.capacity)
+
+    def full(self):
+        return self.unflushed == self.capacity
+
+    # The last `count` steps of one field in the order they were added, as at most two slices
+    def _chronological(self, name, count):
+        array = self.arrays[name]
+        first = self.position - count
+        if first >= 0:
+            return [array[first:self.position]]
+        return [array[first:], array[:self.position]]
+
+    # A copy of everything held, oldest step first
+    def ordered(self, name):
+        return np.concatenate(self._chronological(name, self.size))
+
+    # Append the steps added since the last flush to <directory>/<field>.dat and rewrite the metadata
+    def flush(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        mode = "wb" if self.flushed_steps == 0 else "ab"
+        for name in self.FIELDS:
+            with open(os.path.join(directory, f"{name}.dat"), mode) as f:
+                for part in self._chronological(name, self.unflushed):
+                    part.tofile(f)
+        self.flushed_steps += self.unflushed
+        self.unflushed = 0
+        meta = {
+            "length": self.flushed_steps,
+            "num_envs": self.num_envs,
+            "fields": {name: {"dtype": array.dtype.str, "shape": list(array.shape[1:])}
+                       for name, array in self.arrays.items()},
+        }
+        with open(os.path.join(directory, "rollout.json"), "w") as f:
+            json.dump(meta, f)
+
+    # Map a flushed rollout back as read-only arrays of shape (length, num_envs, ...)
+    @staticmethod
+    def open_flushed(directory):
+        with open(os.path.join(directory, "rollout.json")) as f:
+            meta = json.load(f)
+        return {
+            name: np.memmap(os.path.join(directory, f"{name}.dat"), dtype=np.dtype(field["dtype"]), mode="r",
+                            shape=(meta["length"], *field["shape"]))
+            for name, field in meta["fields"].items()
+        }
+
+# Per-episode returns and lengths from (steps, num_envs) reward and done arrays, without a Python loop over steps.
+# The arrays are read chunk_steps rows at a time, so memmapped rollouts are never loaded whole; each chunk takes
+# running sums down every column, and an episode is the difference between the sums at two consecutive done flags of
+# the same environment, with each environment's unfinished return and length carried into the next chunk.
+# Episodes still running at the end are left out, and so are the first ones when they began before the window
+# (drop_first, e.g. after a ring buffer has wrapped)
+def episode_statistics(rewards, terminated, truncated, drop_first=False, chunk_steps=65536):
+    steps, num_envs = rewards.shape
+    carried_returns = np.zeros(num_envs)
+    carried_lengths = np.zeros(num_envs, dtype=np.int64)
+    seen_end = np.zeros(num_envs, dtype=bool)
+    env_parts, return_parts, length_parts = [], [], []
+
+    for first in range(0, steps, chunk_steps):
+        chunk_rewards = np.asarray(rewards[first:first + chunk_steps], dtype=np.float64)
+        done = np.asarray(terminated[first:first + chunk_steps]) | np.asarray(truncated[first:first + chunk_steps])
+        rows = len(chunk_rewards)
+        # Running return and length of each environment's current episode, as if it never ended inside the chunk
+        running_returns = carried_returns + np.cumsum(chunk_rewards, axis=0)
+        running_lengths = carried_lengths + np.arange(1, rows + 1)[:, None]
+
+        # Done flags in environment-major order, so consecutive entries of one environment are adjacent
+        ends = np.flatnonzero(done.T)
+        env_index = ends // rows
+        flat_returns = running_returns.T.ravel()
+        flat_lengths = running_lengths.T.ravel()
+        previous_end = np.concatenate(([-1], ends[:-1]))
+        same_env = (previous_end >= 0) & (previous_end // rows == env_index)
+        returns = flat_returns[ends] - np.where(same_env, flat_returns[previous_end], 0.0)
+        lengths = flat_lengths[ends] - np.where(same_env, flat_lengths[previous_end], 0)
+
+        keep = same_env | seen_end[env_index] if drop_first else slice(None)
+        env_parts.append(env_index[keep])
+        return_parts.append(returns[keep])
+        length_parts.append(lengths[keep])
+
+        # Carry what each environment accumulated after its last done flag into the next chunk
+        last_done = np.where(done.any(axis=0), rows - 1 - np.argmax(done[::-1], axis=0), -1)
+        ended = last_done >= 0
+        columns = np.arange(num_envs)
+        carried_returns = running_returns[-1] - np.where(ended, running_returns[last_done, columns], 0.0)
+        carried_lengths = running_lengths[-1] - np.where(ended, running_lengths[last_done, columns], 0)
+        seen_end |= ended
+
+    if not env_parts:
+        return {"env": np.zeros(0, dtype=np.int64), "returns": np.zeros(0), "lengths": np.zeros(0, dtype=np.int64)}
+    return {"env": np.concatenate(env_parts), "returns": np.concatenate(return_parts),
+            "lengths": np.concatenate(length_parts)}
+
+# One-line summary of episode statistics
+def summarize_episodes(stats):
+    returns, lengths = stats["returns"], stats["lengths"]
+    if len(returns) == 0:
+        return "no finished episodes"
+    return (f"{len(returns)} episodes, reward mean {returns.mean():.1f} (std {returns.std():.1f}, "
+            f"min {returns.min():.1f}, max {returns.max():.1f}), length mean {lengths.mean():.1f}")
+
+# Run num_envs copies through a vector env; finished environments reset themselves inside step(),
+# so returns and lengths are accumulated per environment and recorded where an episode ends
+def run_vector_env(env_id=ENV_ID, num_envs=8, total_steps=10000, seed=42, asynchronous=False, buffer_capacity=0,
+                   flush_directory=None):
+    env_fns = [lambda: gym.make(env_id) for _ in range(num_envs)]
+    envs = gym.vector.AsyncVectorEnv(env_fns) if asynchronous else gym.vector.SyncVectorEnv(env_fns)
+    envs.action_space.seed(seed)
+    observations, infos = envs.reset(seed=seed)
+    buffer = None
+    if buffer_capacity:
+        buffer = RolloutBuffer(buffer_capacity, num_envs, envs.single_observation_space, envs.single_action_space)
+
+    returns = np.zeros(num_envs)
+    lengths = np.zeros(num_envs, dtype=np.int64)
+    episode_rewards = []
+    episode_lengths = []
+    iterations = -(-total_steps // num_envs)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        actions = envs.action_space.sample()  # One batched sample for every environment
+        previous_observations = observations
+        observations, rewards, terminated, truncated, infos = envs.step(actions)
+        if buffer is not None:
+            buffer.add(previous_observations, actions, rewards, terminated, truncated)
+            if flush_directory and buffer.full():
+                buffer.flush(flush_directory)
+        returns += rewards
+        lengths += 1
+        done = terminated | truncated
+        if done.any():
+            episode_rewards.extend(returns[done].tolist())
+            episode_lengths.extend(lengths[done].tolist())
+            returns[done] = 0.0
+            lengths[done] = 0
+    if buffer is not None and flush_directory:
+        buffer.flush(flush_directory)
+    elapsed = time.perf_counter() - start
+    envs.close()
+    return iterations * num_envs, elapsed, episode_rewards, episode_lengths, buffer
+
+# Print throughput and episode statistics for one run
+def report(label, steps, elapsed, episode_rewards):
+    average = sum(episode_rewards) / len(episode_rewards) if episode_rewards else float("nan")
+    print(f"{label}: {steps} steps in {elapsed:.2f}s ({steps / elapsed:,.0f} steps/sec), "
+          f"{len(episode_rewards)} episodes, average reward {average:.1f}")
+
+# Environment steps/sec of the single-env loop against the synchronous and asynchronous vector envs
+def benchmark(env_id=ENV_ID, num_envs=8, total_steps=20000, seed=42):
+    steps, elapsed, episode_rewards = run_single_env(env_id, total_steps, seed)
+    report("single env", steps, elapsed, episode_rewards)
+    for asynchronous in (False, True):
+        steps, elapsed, episode_rewards, _, _ = run_vector_env(env_id, num_envs, total_steps, seed, asynchronous)
+        report(f"{'async' if asynchronous else 'sync'} vector env x{num_envs}", steps, elapsed, episode_rewards)
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Random agent on Lunar Lander.")
+    parser.add_argument("--env-id", default=ENV_ID, help="Gymnasium environment id for the headless modes")
+    parser.add_argument("--headless", action="store_true", help="Run vector envs without rendering")
+    parser.add_argument("--num-envs", type=int, default=8, help="Environments per vector env")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync", help="Vector env type for --headless")
+    parser.add_argument("--steps", type=int, default=20000, help="Environment steps for the headless modes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--benchmark", action="store_true", help="Compare single, sync and async steps/sec")
+    parser.add_argument("--buffer-capacity", type=int, default=4096, help="Vector steps held by the rollout buffer")
+    parser.add_argument("--flush-directory", help="Append the rollout buffer to np.memmap files here when it fills")
+    parser.add_argument("--analyze", metavar="DIRECTORY", help="Episode statistics of a flushed rollout")
+    args = parser.parse_args()
+
+    if args.analyze:
+        rollout = RolloutBuffer.open_flushed(args.analyze)
+        print(f"{args.analyze}: {rollout['rewards'].shape[0]} vector steps x {rollout['rewards'].shape[1]} envs")
+        print(summarize_episodes(episode_statistics(rollout["rewards"], rollout["terminated"], rollout["truncated"])))
+    elif args.benchmark:
+        benchmark(args.env_id, args.num_envs, args.steps, args.seed)
+    elif args.headless:
+        steps, elapsed, episode_rewards, _, buffer = run_vector_env(
+            args.env_id, args.num_envs, args.steps, args.seed, args.mode == "async",
+            args.buffer_capacity, args.flush_directory)
+        report(f"{args.mode} vector env x{args.num_envs}", steps, elapsed, episode_rewards)
+        if buffer is not None and not args.flush_directory:
+            stats = episode_statistics(buffer.ordered("rewards"), buffer.ordered("terminated"),
+                                       buffer.ordered("truncated"), drop_first=buffer.wrapped)
+            print(f"Last {buffer.size} vector steps in the buffer: {summarize_episodes(stats)}")
+    else:
+        main()
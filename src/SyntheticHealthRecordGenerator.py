@@ -9,6 +9,22 @@
 # to generate personal information and statistical methods for health-related data.
 #
 # Setup: Python installed with Faker. Install using 'pip install Faker'.
+# Parquet output also needs pyarrow ('pip install pyarrow').
+#
+# Usage: 'python SyntheticHealthRecordGenerator.py' writes 100 records as before. For load-test sized data,
+# 'python SyntheticHealthRecordGenerator.py --records 20000000 --workers 8 --format parquet' generates the health
+# columns a block at a time with NumPy and streams each block to disk. The records are split into fixed-size shards,
+# each written to its own part file by a worker process with a seed derived from (--seed, shard number), so the
+# output is the same whatever the number of workers. '--benchmark' compares records/sec with generate_health_record.
+# '--compact' writes a smaller layout: blood type, allergies and medication as categoricals (Arrow dictionary columns
+# in Parquet), names and addresses as indexes into pools of --pool-size values generated once from the seed, and blood
+# pressure as two uint8 columns. '--measure' compares memory and file sizes of both layouts for 1M records.
+
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
 from faker import Faker
@@ -17,6 +33,11 @@ import random
 
 faker = Faker()
 
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'O+', 'O-', 'AB+', 'AB-']
+ALLERGIES = ['None', 'Penicillin', 'Nuts', 'Latex', 'Pollen']
+MEDICATIONS = ['None', 'Aspirin', 'Insulin', 'Metformin', 'Lisinopril']
+MAX_AGE_DAYS = 115 * 365  # Faker's date_of_birth covers ages 0 to 115
+
 def generate_health_record(num_records):
     records = []
 
@@ -35,10 +56,181 @@ def generate_health_record(num_records):
 
     return pd.DataFrame(records)
 
-# Generate 100 synthetic health records
-synthetic_data = generate_health_record(100)
+# One block of records: health columns drawn in one NumPy call each, names and addresses from a seeded Faker.
+# Faker still costs a call per name and address, so personal=False leaves those two columns out
+def generate_health_block(num_records, rng, block_faker, today, personal=True):
+    systolic = rng.integers(90, 140, num_records).astype(str)
+    diastolic = rng.integers(60, 90, num_records).astype(str)
+    block = pd.DataFrame({
+        'Date of Birth': today - rng.integers(0, MAX_AGE_DAYS, num_records).astype('timedelta64[D]'),
+        'Blood Type': np.array(BLOOD_TYPES)[rng.integers(0, len(BLOOD_TYPES), num_records)],
+        'Heart Rate (bpm)': rng.normal(70, 10, num_records),
+        'Blood Pressure': np.char.add(np.char.add(systolic, '/'), diastolic),
+        'Allergies': np.array(ALLERGIES)[rng.integers(0, len(ALLERGIES), num_records)],
+        'Medication': np.array(MEDICATIONS)[rng.integers(0, len(MEDICATIONS), num_records)],
+    })
+    if personal:
+        block.insert(0, 'Patient Name', [block_faker.name() for _ in range(num_records)])
+        block.insert(2, 'Address', [block_faker.address() for _ in range(num_records)])
+    return block
+
+_value_pools = {}
+
+# Distinct names and addresses generated once per process from the run seed, so every shard indexes the same pools
+def value_pools(seed, size):
+    if (seed, size) not in _value_pools:
+        pool_faker = Faker()
+        pool_faker.seed_instance(seed)
+        names = list(dict.fromkeys(pool_faker.name() for _ in range(size)))
+        addresses = list(dict.fromkeys(pool_faker.address() for _ in range(size)))
+        _value_pools[(seed, size)] = (names, addresses)
+    return _value_pools[(seed, size)]
+
+# Categorical column made straight from random codes, without building a string per row
+def random_categorical(rng, categories, num_records):
+    return pd.Categorical.from_codes(rng.integers(0, len(categories), num_records), categories=categories)
+
+# Compact block: categoricals for repeated values, pool indexes for names and addresses, blood pressure as two uint8s
+def generate_compact_block(num_records, rng, pools, today):
+    names, addresses = pools
+    return pd.DataFrame({
+        'Patient Name': random_categorical(rng, names, num_records),
+        'Date of Birth': today - rng.integers(0, MAX_AGE_DAYS, num_records).astype('timedelta64[D]'),
+        'Address': random_categorical(rng, addresses, num_records),
+        'Blood Type': random_categorical(rng, BLOOD_TYPES, num_records),
+        'Heart Rate (bpm)': rng.normal(70, 10, num_records),
+        'Systolic (mmHg)': rng.integers(90, 140, num_records, dtype=np.uint8),
+        'Diastolic (mmHg)': rng.integers(60, 90, num_records, dtype=np.uint8),
+        'Allergies': random_categorical(rng, ALLERGIES, num_records),
+        'Medication': random_categorical(rng, MEDICATIONS, num_records),
+    })
+
+# Memory and CSV/Parquet sizes of the DataFrame generate_health_record builds today and of the compact layout.
+# The baseline runs Faker once per name and address, as the existing generator does, so 1M records take minutes
+def measure_layouts(num_records=1000000, pool_size=10000, seed=0):
+    faker.seed_instance(seed)
+    np.random.seed(seed)
+    random.seed(seed)
+    start = time.perf_counter()
+    current = generate_health_record(num_records)
+    print(f"Generated the current layout in {time.perf_counter() - start:.1f}s")
+    rng, _ = shard_random_state(seed, 0)
+    compact = generate_compact_block(num_records, rng, value_pools(seed, pool_size), np.datetime64('today', 'D'))
+    directory = tempfile.mkdtemp()
+    for label, frame in (("current", current), ("compact", compact)):
+        csv_path = os.path.join(directory, f"{label}.csv")
+        parquet_path = os.path.join(directory, f"{label}.parquet")
+        frame.to_csv(csv_path, index=False)
+        frame.to_parquet(parquet_path, index=False)
+        print(f"{label}: {num_records} records, {frame.memory_usage(deep=True).sum() / 2**20:,.1f} MiB in memory, "
+              f"CSV {os.path.getsize(csv_path) / 2**20:,.1f} MiB, "
+              f"Parquet {os.path.getsize(parquet_path) / 2**20:,.1f} MiB")
+        os.remove(csv_path)
+        os.remove(parquet_path)
+    os.rmdir(directory)
+
+# Random state for one shard, derived only from the run seed and the shard number
+def shard_random_state(seed, shard):
+    sequence = np.random.SeedSequence(seed, spawn_key=(shard,))
+    shard_faker = Faker()
+    shard_faker.seed_instance(int(sequence.generate_state(1)[0]))
+    return np.random.default_rng(sequence), shard_faker
+
+# Worker: generate one shard block by block, streaming each block to the shard's part file
+def write_shard(shard, num_records, output_dir, file_format, seed, block_records, today, personal=True,
+                compact=False, pool_size=10000):
+    rng, shard_faker = shard_random_state(seed, shard)
+    pools = value_pools(seed, pool_size) if compact else None
+    path = os.path.join(output_dir, f"part-{shard:05d}.{file_format}")
+    writer = None
+    for first in range(0, num_records, block_records):
+        count = min(block_records, num_records - first)
+        if compact:
+            block = generate_compact_block(count, rng, pools, today)
+        else:
+            block = generate_health_block(count, rng, shard_faker, today, personal)
+        if file_format == 'csv':
+            block.to_csv(path, mode='w' if first == 0 else 'a', header=first == 0, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(block, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    if writer is not None:
+        writer.close()
+    return num_records
+
+# Generate num_records across fixed-size shards on a process pool; returns (records, seconds)
+def generate_sharded(num_records, output_dir, file_format='csv', workers=4, shard_records=1000000,
+                     block_records=50000, seed=0, today=None, personal=True, compact=False, pool_size=10000):
+    os.makedirs(output_dir, exist_ok=True)
+    today = np.datetime64(today or 'today', 'D')
+    shards = [(shard, min(shard_records, num_records - first))
+              for shard, first in enumerate(range(0, num_records, shard_records))]
+    args = [(shard, count, output_dir, file_format, seed, block_records, today, personal, compact, pool_size)
+            for shard, count in shards]
+    start = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            written = sum(pool.map(write_shard, *zip(*args)))
+    else:
+        written = sum(write_shard(*arguments) for arguments in args)
+    return written, time.perf_counter() - start
+
+# Records/sec of the per-record generator against the block generator (one process, no file output)
+def benchmark(num_records=20000, seed=0):
+    start = time.perf_counter()
+    generate_health_record(num_records)
+    original_seconds = time.perf_counter() - start
+
+    timings = [("generate_health_record", original_seconds)]
+    for personal in (True, False):
+        rng, block_faker = shard_random_state(seed, 0)
+        start = time.perf_counter()
+        generate_health_block(num_records, rng, block_faker, np.datetime64('today', 'D'), personal)
+        timings.append((f"generate_health_block{'' if personal else ', no names/addresses'}",
+                        time.perf_counter() - start))
+
+    for label, seconds in timings:
+        print(f"{label}: {num_records} records in {seconds:.2f}s ({num_records / seconds:,.0f} records/sec)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic health records.")
+    parser.add_argument('--records', type=int, help="Generate this many records with the sharded block generator")
+    parser.add_argument('--output-dir', default='synthetic_health_records', help="Directory for the part files")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help="Part file format")
+    parser.add_argument('--workers', type=int, default=4, help="Worker processes")
+    parser.add_argument('--shard-records', type=int, default=1000000, help="Records per shard (part file)")
+    parser.add_argument('--block-records', type=int, default=50000, help="Records generated and written at once")
+    parser.add_argument('--seed', type=int, default=0, help="Seed; the same seed gives the same files")
+    parser.add_argument('--today', help="Reference date for birth dates (YYYY-MM-DD), for reproducible reruns")
+    parser.add_argument('--no-personal', action='store_true', help="Leave out the Faker name and address columns")
+    parser.add_argument('--compact', action='store_true', help="Categorical, pooled and integer column layout")
+    parser.add_argument('--pool-size', type=int, default=10000, help="Names and addresses in the --compact pools")
+    parser.add_argument('--benchmark', action='store_true', help="Compare records/sec of both generators")
+    parser.add_argument('--measure', action='store_true', help="Compare memory and file sizes of both layouts")
+    parser.add_argument('--measure-records', type=int, default=1000000, help="Records for --measure")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+        raise SystemExit
+    if args.measure:
+        measure_layouts(args.measure_records, args.pool_size, args.seed)
+        raise SystemExit
+    if args.records:
+        written, seconds = generate_sharded(args.records, args.output_dir, args.format, args.workers,
+                                            args.shard_records, args.block_records, args.seed, args.today,
+                                            not args.no_personal, args.compact, args.pool_size)
+        print(f"Wrote {written} records to '{args.output_dir}' in {seconds:.2f}s ({written / seconds:,.0f} records/sec)")
+        raise SystemExit
+
+    # Generate 100 synthetic health records
+    synthetic_data = generate_health_record(100)
 
-# Save the generated data to a CSV file
-output_file = 'synthetic_health_records.csv'
-synthetic_data.to_csv(output_file, index=False)
-print(f"Data saved to {output_file}")
\ No newline at end of file
+    # Save the generated data to a CSV file
+    output_file = 'synthetic_health_records.csv'
+    synthetic_data.to_csv(output_file, index=False)
+    print(f"Data saved to {output_file}")
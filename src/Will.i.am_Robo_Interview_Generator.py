@@ -7,12 +7,21 @@
 # About: The script exemplifies the application of AI for educational and preparatory purposes, specifically in the context of job interviews. It leverages the OpenAI GPT-4 model to generate articulate and concise answers to interview questions, reflecting the specified persona of a robot named Robo. This process not only highlights the capabilities of AI in understanding and generating human-like responses but also showcases its potential in educational tools and resources. Additionally, the script demonstrates practical skills in Python programming, including working with CSV files, handling document creation, and utilizing environmental variables for API keys.
 #
 # Setup: Requires Python with libraries: langchain_openai for interacting with OpenAI's GPT-4, langchain_core for prompt management, csv for reading CSV files, and python-docx for Word document manipulation. Install dependencies using 'pip install langchain_openai langchain_core python-docx'.
+# Responses are cached by Langchain_ResponseCache.py, so rerunning with the same questions doesn't call the API again.
+# The rated questions are selected up front and sent to the model concurrently ('--max-concurrency', optionally
+# throttled with '--requests-per-second'); the document and endnotes still follow the original question order.
+# '--benchmark' times 100 questions serially and concurrently against a local stand-in model with injected latency.
 
+import argparse
+import asyncio
 import os
+import time
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.rate_limiters import InMemoryRateLimiter
 import csv
 from docx import Document
+from Langchain_ResponseCache import SlowFakeChatModel, shared_cache
 
 # Constants
 OPENAI_API_KEY =  "INSERT_YOUR_OPENAI_KEY_HERE"
@@ -20,57 +29,115 @@ DATASET_FILE_PATH = "../datasets/will.i.am-interview-question-answers.csv"
 WORD_DOCUMENT_PATH = "../datasets/mock_interview.docx"
 LANGUAGE = "an articulate humanoid robot voice, identifying as a girl named Robo"
 NUM_QUESTIONS = 10
+MAX_CONCURRENCY = 10
 
 # Set environment variable for OpenAI API key
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
-# Initialize the language model and document
-llm = ChatOpenAI(temperature=0)
-document = Document()
-
 # Define a prompt template
 prompt_template = ChatPromptTemplate.from_messages([
     ("system", "Please respond as a question in {language} in 25 words or less. {validate}"),
     ("human", "{input}")
 ])
 
+# Initialize the language model; repeated prompts are answered from the shared response cache.
+# The stand-in model skips the cache so its timings reflect every call.
+def build_llm(fake=False, fake_latency=1.0, requests_per_second=None, max_concurrency=MAX_CONCURRENCY):
+    rate_limiter = None
+    if requests_per_second:
+        rate_limiter = InMemoryRateLimiter(requests_per_second=requests_per_second,
+                                           check_every_n_seconds=0.01, max_bucket_size=max_concurrency)
+    if fake:
+        return SlowFakeChatModel(responses=["What inspires you, human?"], latency=fake_latency,
+                                 rate_limiter=rate_limiter)
+    return ChatOpenAI(temperature=0, cache=shared_cache(), rate_limiter=rate_limiter)
+
+# Pick the rows rated '1': the first is the introduction, then up to num_questions questions
+def select_rated_rows(file_path=DATASET_FILE_PATH, num_questions=NUM_QUESTIONS):
+    rows = []
+    with open(file_path, mode='r', encoding='ISO-8859-1') as file:
+        for row in csv.DictReader(file):
+            if row['Rating'] == '1':
+                rows.append(row)
+                if len(rows) > num_questions:
+                    break
+    return rows
+
 # Function to process a single question
-def process_question(input_question, validate=""):
-    response = prompt_template | llm
-    processed_response = response.invoke({"input": input_question, "validate": validate, "language": LANGUAGE})
+def process_question(chain, input_question, validate=""):
+    processed_response = chain.invoke({"input": input_question, "validate": validate, "language": LANGUAGE})
     print(processed_response.content)
     return processed_response.content
 
-# Read dataset and process questions
-with open(DATASET_FILE_PATH, mode='r', encoding='ISO-8859-1') as file:
-    csv_reader = csv.DictReader(file)
-    questions_processed = 0
+# Process all questions concurrently; abatch returns the responses in the order of the inputs
+async def process_questions(chain, input_questions, validate="", max_concurrency=MAX_CONCURRENCY):
+    inputs = [{"input": question, "validate": validate, "language": LANGUAGE} for question in input_questions]
+    responses = await chain.abatch(inputs, config={"max_concurrency": max_concurrency})
+    for response in responses:
+        print(response.content)
+    return [response.content for response in responses]
+
+# Write the introduction, questions with their original answers, and endnotes, in question order
+def build_document(rows, responses):
+    document = Document()
     endnotes = []
+    for questions_processed, (row, response) in enumerate(zip(rows, responses)):
+        if questions_processed == 0:
+            # The first question becomes the introduction
+            document.add_paragraph(f"Introduction: {response}\n")
+        else:
+            document.add_paragraph(f"Q{questions_processed}: {response}")
+            document.add_paragraph(f"A{questions_processed}: {row['Answer']}")
+            endnotes.append(row['Reference'])
+
+    # Add endnotes
+    document.add_page_break()
+    document.add_paragraph("Endnotes:")
+    for i, note in enumerate(endnotes, start=1):
+        document.add_paragraph(f"{i}. {note}")
+    return document
+
+# Time num_questions calls serially and concurrently against the stand-in model
+def benchmark(num_questions=100, fake_latency=1.0, max_concurrency=100):
+    chain = prompt_template | build_llm(fake=True, fake_latency=fake_latency)
+    questions = [f"Question {i}: what is next for AI?" for i in range(num_questions)]
+
+    start = time.perf_counter()
+    process_question(chain, questions[0])
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    asyncio.run(process_questions(chain, questions, max_concurrency=max_concurrency))
+    concurrent = time.perf_counter() - start
+    print(f"Single call: {single:.2f}s; {num_questions} concurrent calls (max_concurrency={max_concurrency}): "
+          f"{concurrent:.2f}s; serial estimate {single * num_questions:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a mock interview document with Robo's questions.")
+    parser.add_argument('--num-questions', type=int, default=NUM_QUESTIONS, help="Questions after the introduction")
+    parser.add_argument('--max-concurrency', type=int, default=MAX_CONCURRENCY, help="Maximum LLM calls in flight")
+    parser.add_argument('--requests-per-second', type=float, help="Throttle LLM calls to this rate")
+    parser.add_argument('--fake-llm', action='store_true', help="Use a local stand-in model instead of OpenAI")
+    parser.add_argument('--fake-latency', type=float, default=1.0, help="Seconds each stand-in call takes")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="Compare one call with 100 concurrent calls to the stand-in model, then exit")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(100, args.fake_latency, max(args.max_concurrency, 100))
+        raise SystemExit
+
+    # Read dataset and process questions
+    start = time.perf_counter()
+    rows = select_rated_rows(DATASET_FILE_PATH, args.num_questions)
+    chain = prompt_template | build_llm(args.fake_llm, args.fake_latency, args.requests_per_second, args.max_concurrency)
+    responses = asyncio.run(process_questions(chain, [row['Question'] for row in rows],
+                                              max_concurrency=args.max_concurrency))
+    document = build_document(rows, responses)
+
+    # Save the document
+    document.save(WORD_DOCUMENT_PATH)
 
-    for row in csv_reader:
-        if row['Rating'] == '1':
-            if questions_processed == 0:
-                # Process the first question for introduction
-                intro_response = process_question(row['Question'])
-                document.add_paragraph(f"Introduction: {intro_response}\n")
-            else:
-                # Process subsequent questions
-                processed_question = process_question(row['Question'])
-                document.add_paragraph(f"Q{questions_processed}: {processed_question}")
-                document.add_paragraph(f"A{questions_processed}: {row['Answer']}")
-                endnotes.append(row['Reference'])
-
-            questions_processed += 1
-            if questions_processed > NUM_QUESTIONS:
-                break
-
-# Add endnotes
-document.add_page_break()
-document.add_paragraph("Endnotes:")
-for i, note in enumerate(endnotes, start=1):
-    document.add_paragraph(f"{i}. {note}")
-
-# Save the document
-document.save(WORD_DOCUMENT_PATH)
-
-print(f"Mock interview document with {NUM_QUESTIONS} questions saved as '{WORD_DOCUMENT_PATH}'")
+    print(f"Mock interview document with {max(0, len(rows) - 1)} questions saved as '{WORD_DOCUMENT_PATH}' "
+          f"in {time.perf_counter() - start:.2f}s")
+    print(f"Response cache: {shared_cache().stats()}")